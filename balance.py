@@ -0,0 +1,173 @@
+"""
+Symulacje balansu gry.
+
+Uruchamia wiele rozgrywek headless sterowanych botem (random_keys_script)
+równolegle w puli procesów, dla każdej kombinacji strojonych parametrów
+i kolejnych ziaren. Wyniki pojedynczych gier spływają na bieżąco,
+a na końcu są zbierane w tabelę (średnie na kombinację parametrów).
+
+Użycie:
+    python balance.py [--runs N] [--set NAZWA=W1,W2 ...] [--ticks N] [--jobs N] [--output wyniki.json]
+
+Przykład:
+    python balance.py --runs 100 --set spawn_interval=1000,2000 --set max_enemies=10,20,40
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import roguelike as game
+
+# Strojone parametry: nazwa -> (klasa, typ wartości); nazwa to atrybut klasy
+TUNABLES = {
+    "spawn_interval": (game.GameScene, int),
+    "max_enemies": (game.GameScene, int),
+    "drop_chance": (game.Enemy, float),
+    "holy_water_damage_step": (game.Player, int),
+    "holy_water_aoe_growth": (game.Player, float),
+    "level_exp_step": (game.Player, int),
+    "holy_water_interval": (game.AreaEffects, int),
+    "holy_water_duration": (game.AreaEffects, int),
+    "explosion_damage": (game.AreaEffects, int),
+}
+DEFAULTS = {name: getattr(owner, name) for name, (owner, _) in TUNABLES.items()}
+METRICS = ("survival_s", "kills", "level", "alive", "frame_ms")
+
+
+def apply_params(params):
+    """Ustawia parametry balansu (pozostałe wracają do wartości domyślnych - proces jest używany wielokrotnie)."""
+    for name, (owner, _) in TUNABLES.items():
+        setattr(owner, name, params.get(name, DEFAULTS[name]))
+
+
+def run_game(params, seed, max_ticks, step_ms, upgrades):
+    """Jedna rozgrywka bota (w procesie roboczym); zwraca jej metryki."""
+    apply_params(params)
+    source = game.ScriptedInput(game.random_keys_script(seed), upgrades=upgrades)
+    start = time.perf_counter()
+    result = game.main(headless=True, input_source=source, clock=game.SimulatedClock(step_ms),
+                       max_ticks=max_ticks, seed=seed)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return {
+        "params": params,
+        "seed": seed,
+        "ticks": result["ticks"],
+        "survival_s": result["time_ms"] / 1000,
+        "kills": result["bats_defeated"],
+        "level": result["level"],
+        "alive": result["alive"],
+        "frame_ms": elapsed_ms / max(result["ticks"], 1),  # Średni koszt klatki (czas rzeczywisty)
+    }
+
+
+def parse_setting(text):
+    """NAZWA=W1,W2 -> (nazwa, [wartości])."""
+    name, _, values = text.partition("=")
+    if name not in TUNABLES or not values:
+        raise argparse.ArgumentTypeError(f"oczekiwano NAZWA=W1,W2 z nazwą spośród: {', '.join(TUNABLES)}")
+    convert = TUNABLES[name][1]
+    try:
+        return name, [convert(value) for value in values.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"niepoprawna wartość parametru {name}: {values}")
+
+
+def parameter_grid(settings):
+    """Wszystkie kombinacje podanych wartości (iloczyn kartezjański); bez --set jedna kombinacja domyślna."""
+    names = [name for name, _ in settings]
+    return [dict(zip(names, values)) for values in itertools.product(*(values for _, values in settings))]
+
+
+def summarize(runs):
+    """Agregaty metryk dla jednej kombinacji parametrów."""
+    summary = {"runs": len(runs)}
+    for metric in METRICS:
+        values = [float(run[metric]) for run in runs]
+        summary[metric] = statistics.fmean(values)
+    summary["survival_median_s"] = statistics.median(run["survival_s"] for run in runs)
+    return summary
+
+
+def format_table(names, rows):
+    """Tabela wyników: kolumny parametrów i agregatów."""
+    header = [*names, "runs", "alive %", "survival s", "median s", "kills", "level", "frame ms"]
+    lines = []
+    for params, summary in rows:
+        lines.append([
+            *(str(params[name]) for name in names),
+            str(summary["runs"]),
+            f"{summary['alive'] * 100:.0f}",
+            f"{summary['survival_s']:.1f}",
+            f"{summary['survival_median_s']:.1f}",
+            f"{summary['kills']:.1f}",
+            f"{summary['level']:.2f}",
+            f"{summary['frame_ms']:.3f}",
+        ])
+    widths = [max(len(cell) for cell in column) for column in zip(header, *lines)]
+    return "\n".join(" ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in [header, *lines])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Równoległe symulacje balansu gry")
+    parser.add_argument("--runs", type=int, default=10, help="liczba rozgrywek (ziaren) na kombinację parametrów")
+    parser.add_argument("--seed", type=int, default=0, help="pierwsze ziarno (kolejne rozgrywki: seed, seed+1, ...)")
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], metavar="NAZWA=W1,W2",
+                        help="wartości strojonego parametru: " + ", ".join(TUNABLES))
+    parser.add_argument("--ticks", type=int, default=36000, help="limit klatek jednej rozgrywki")
+    parser.add_argument("--step-ms", type=float, default=game.TICK_MS, help="krok logiki zegara symulowanego w ms")
+    parser.add_argument("--upgrades", type=int, nargs="+", default=[1, 3, 2],
+                        help="kolejne wybory nagród za poziom (1: obrażenia, 2: max HP, 3: Holy Water)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="liczba procesów roboczych")
+    parser.add_argument("--output", default=None, help="plik JSON z wynikami wszystkich rozgrywek")
+    args = parser.parse_args(argv)
+
+    grid = parameter_grid(args.set)
+    names = [name for name, _ in args.set]
+    tasks = [(params, args.seed + run) for params in grid for run in range(args.runs)]
+    runs = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_game, params, seed, args.ticks, args.step_ms, args.upgrades)
+                   for params, seed in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            run = future.result()
+            runs.append(run)
+            label = ", ".join(f"{name}={value}" for name, value in run["params"].items())
+            print(f"[{done:{len(str(len(tasks)))}}/{len(tasks)}] seed {run['seed']:<6} {label:40} "
+                  f"{run['survival_s']:7.1f} s  kills {run['kills']:4}  level {run['level']:3}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    rows = []
+    for params in grid:
+        matching = [run for run in runs if run["params"] == params]
+        rows.append((params, summarize(matching)))
+    print(format_table(names, rows))
+    print(f"{len(runs)} rozgrywek w {elapsed:.1f} s ({args.jobs} procesów)", file=sys.stderr)
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "jobs": args.jobs,
+                "ticks": args.ticks,
+                "step_ms": args.step_ms,
+                "upgrades": args.upgrades,
+                "defaults": DEFAULTS,
+            },
+            "summary": [{"params": params, **summary} for params, summary in rows],
+            "runs": sorted(runs, key=lambda run: (grid.index(run["params"]), run["seed"])),
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
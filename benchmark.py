@@ -0,0 +1,338 @@
+"""
+Benchmark scenariuszy gry.
+
+Buduje skryptowe scenariusze bezpośrednio z klas gry (10 - 10k przeciwników,
+setki pocisków, wiele kałuż Holy Water, dużo bloków wybuchowych) i mierzy
+osobno czas poszczególnych podsystemów. Wyniki są zapisywane jako JSON,
+aby można było porównywać kolejne uruchomienia.
+
+Użycie:
+    python benchmark.py [--repeat N] [--only FRAGMENT_NAZWY] [--output wyniki.json]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+import pygame
+
+import roguelike as game
+
+ENEMY_COUNTS = (10, 100, 1000, 10000)
+PROJECTILE_COUNTS = (100, 500)
+HOLY_WATER_COUNTS = (10, 100)
+BLOCK_COUNTS = (100, 1000)
+UNKILLABLE_HP = 10 ** 9  # Przeciwnicy nie giną, więc każde powtórzenie ma ten sam stan
+
+
+def build_world(enemy_count, seed=0, map_size=(game.MAP_WIDTH, game.MAP_HEIGHT), step_ms=1000 / 60):
+    """
+    Tworzy świat gry z podaną liczbą przeciwników rozstawionych losowo na mapie.
+    Czas płynie według nowego zegara symulowanego (world["clock"]).
+    """
+    random.seed(seed)
+    clock = game.SimulatedClock(step_ms)
+    game.set_clock(clock)
+    map_width, map_height = map_size
+    player = game.Player(map_width // 2, map_height // 2)
+    player.upgrade_chooser = lambda p: 1  # Bez okien dialogowych
+    enemies = game.EnemyGroup()
+    for _ in range(enemy_count):
+        enemies.spawn(random.randint(0, map_width - 1), random.randint(0, map_height - 1), UNKILLABLE_HP, 10)
+    camera = game.Camera(game.WIDTH, game.HEIGHT)
+    camera.update(player)
+    return {
+        "player": player,
+        "enemies": enemies,
+        "game_map": game.generate_map_vampire_style(map_width, map_height),
+        "camera": camera,
+        "items": game.TileIndex(),
+        "blocks": game.TileIndex(),
+        "effects": game.AreaEffects(),
+        "map_size": map_size,
+        "clock": clock,
+    }
+
+
+def measure(run, repeat, setup=None):
+    """Zwraca statystyki czasu (ms) wywołania run(); setup() jest wywoływane poza pomiarem."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "min_ms": samples[0],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max_ms": samples[-1],
+    }
+
+
+def bench_enemy_movement(enemy_count, repeat):
+    # Krok zegara równy opóźnieniu ruchu: każde wywołanie to jeden krok wszystkich przeciwników
+    world = build_world(enemy_count, step_ms=500)
+    flow_field = game.FlowField()
+
+    def run():
+        player = world["player"]
+        flow_field.update(world["game_map"], player.x, player.y)
+        world["enemies"].move_towards_player(player, flow_field)
+
+    return measure(run, repeat, setup=world["clock"].step)
+
+
+def bench_flow_field(map_size, repeat):
+    world = build_world(0, map_size=map_size)
+    flow_field = game.FlowField()
+    player = world["player"]
+    state = {"step": 1}
+
+    def setup():
+        # Gracz zmienia kafelek, więc każde wywołanie przelicza pole
+        state["step"] = -state["step"]
+        player.x += state["step"]
+
+    return measure(lambda: flow_field.update(world["game_map"], player.x, player.y), repeat, setup=setup)
+
+
+def bench_map_streaming(map_size, repeat):
+    world = build_world(0, map_size=map_size)
+    game_map = world["game_map"]
+    flow_field = game.FlowField()
+    player = world["player"]
+
+    def setup():
+        # Gracz przechodzi na kolejny fragment mapy: nowe fragmenty są generowane, stare zwalniane
+        player.x = (player.x + game_map.chunk_tiles) % map_size[0]
+
+    def run():
+        flow_field.update(game_map, player.x, player.y)
+        game_map.focus(player.x, player.y)
+
+    return measure(run, repeat, setup=setup)
+
+
+def bench_projectiles(projectile_count, enemy_count, block_count, repeat):
+    world = build_world(enemy_count)
+    map_width, map_height = world["map_size"]
+    for _ in range(block_count):
+        world["blocks"].append(game.ExplosiveBlock(random.randint(1, map_width - 2),
+                                                   random.randint(1, map_height - 2)))
+    projectiles = game.ProjectileSystem()
+    rng = random.Random(1)
+
+    def setup():
+        # Świeże pociski w losowych miejscach mapy, lecące w losowych kierunkach
+        projectiles.clear()
+        for _ in range(projectile_count):
+            dx, dy = rng.choice([(0, -1), (0, 1), (-1, 0), (1, 0)])
+            projectiles.spawn(rng.uniform(0, map_width * game.TILE_SIZE),
+                              rng.uniform(0, map_height * game.TILE_SIZE), dx, dy, 10)
+        for block in world["blocks"]:
+            block.is_active = True  # Bloki wybuchają w każdym powtórzeniu od nowa
+        world["effects"].clear()
+
+    def run():
+        projectiles.update(map_width, map_height, world["blocks"], world["enemies"], world["player"],
+                           world["items"], world["effects"])
+
+    return measure(run, repeat, setup=setup)
+
+
+def bench_holy_water(pool_count, enemy_count, repeat):
+    world = build_world(enemy_count)
+    map_width, map_height = world["map_size"]
+    effects = world["effects"]
+    rng = random.Random(2)
+    for _ in range(pool_count):
+        effects.add_holy_water(rng.randint(0, map_width - 1) * game.TILE_SIZE,
+                               rng.randint(0, map_height - 1) * game.TILE_SIZE, 10, game.TILE_SIZE * 2)
+
+    def setup():
+        effects.next_tick[:len(effects)] = game.game_clock.get_ticks()  # Każde powtórzenie to uderzenie wszystkich kałuż
+
+    return measure(lambda: effects.update(world["enemies"], world["player"]), repeat, setup=setup)
+
+
+def bench_explosions(block_count, enemy_count, repeat):
+    world = build_world(enemy_count)
+    map_width, map_height = world["map_size"]
+    blocks = [game.ExplosiveBlock(random.randint(1, map_width - 2), random.randint(1, map_height - 2))
+              for _ in range(block_count)]
+
+    def setup():
+        game.timers.clear()  # Końce eksplozji z poprzedniego powtórzenia nie są potrzebne
+        world["effects"].clear()
+        for block in blocks:
+            block.is_active = True
+
+    def run():
+        for block in blocks:
+            block.explode(world["effects"])
+        world["effects"].update(world["enemies"], world["player"])
+
+    return measure(run, repeat, setup=setup)
+
+
+def bench_draw_map(repeat):
+    world = build_world(0)
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+    camera = world["camera"]
+    offsets = [(0, 0), (400, 300), (800, 1000)]
+    state = {"i": 0}
+
+    def setup():
+        camera.x_offset, camera.y_offset = offsets[state["i"] % len(offsets)]
+        state["i"] += 1
+
+    return measure(lambda: game.draw_map(surface, world["game_map"], camera), repeat, setup=setup)
+
+
+def bench_draw_entities(enemy_count, repeat):
+    world = build_world(enemy_count)
+    map_width, map_height = world["map_size"]
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+    camera = world["camera"]
+    for _ in range(enemy_count // 10):
+        world["items"].append(game.Item(random.randint(0, map_width - 1), random.randint(0, map_height - 1), "weapon1"))
+    projectiles = game.ProjectileSystem()
+    for _ in range(PROJECTILE_COUNTS[-1]):
+        projectiles.spawn(random.uniform(0, map_width * game.TILE_SIZE), random.uniform(0, map_height * game.TILE_SIZE),
+                          1, 0, 10)
+
+    def run():
+        game.draw_items(surface, world["items"], camera)
+        world["enemies"].draw(surface, camera)
+        projectiles.draw(surface, camera)
+
+    return measure(run, repeat)
+
+
+def bench_draw_minimap(enemy_count, repeat):
+    world = build_world(enemy_count)
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+    return measure(lambda: game.draw_minimap(surface, world["game_map"], world["player"], world["enemies"],
+                                             (200, 150), game.WIDTH - 210, 10), repeat)
+
+
+def bench_hud(repeat):
+    world = build_world(0)
+    player = world["player"]
+    player.inventory["weapons"] = ["wooden sword", "bronze sword", "silver sword"]
+    player.inventory["shield"] = "basic shield"
+    player.equipped_weapon = "silver sword"
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+
+    def run():
+        game.Player.draw_xp_bar(surface, player)
+        player.draw_inventory(surface)
+        player.draw_quest_status(surface, game.WIDTH - 210, 10, 200, 150)
+
+    return measure(run, repeat)
+
+
+def bench_snapshot(stage, enemy_count, repeat):
+    random.seed(0)
+    game.set_clock(game.SimulatedClock())
+    scene = game.GameScene(game.ScriptedInput([]), headless=True)
+    map_width, map_height = scene.map_size
+    for _ in range(enemy_count):
+        scene.enemies.spawn(random.randint(0, map_width - 1), random.randint(0, map_height - 1), UNKILLABLE_HP, 10)
+    snapshot = scene.snapshot()
+    data = game.encode_snapshot(snapshot)
+    stages = {
+        "capture": scene.snapshot,  # Koszt w wątku gry
+        "encode": lambda: game.encode_snapshot(snapshot),  # Koszt w wątku zapisu
+        "load": lambda: game.GameScene.from_snapshot(game.decode_snapshot(data), scene.input_source, True),
+    }
+    return measure(stages[stage], repeat)
+
+
+def scenarios():
+    """Zwraca listę (podsystem, parametry, funkcja(repeat) -> statystyki)."""
+    cases = []
+    for count in ENEMY_COUNTS:
+        cases.append(("move_towards_player", {"enemies": count},
+                      lambda repeat, count=count: bench_enemy_movement(count, repeat)))
+    for size in (50, 200, 1000):
+        cases.append(("flow_field_rebuild", {"map": f"{size}x{size}"},
+                      lambda repeat, size=size: bench_flow_field((size, size), repeat)))
+    cases.append(("map_streaming", {"map": "10000x10000"},
+                  lambda repeat: bench_map_streaming((10000, 10000), repeat)))
+    for count in PROJECTILE_COUNTS:
+        for enemy_count in (100, 1000, 10000):
+            cases.append(("projectile_collision", {"projectiles": count, "enemies": enemy_count, "blocks": 0},
+                          lambda repeat, count=count, enemy_count=enemy_count:
+                          bench_projectiles(count, enemy_count, 0, repeat)))
+    for count in BLOCK_COUNTS:
+        cases.append(("projectile_collision", {"projectiles": 500, "enemies": 1000, "blocks": count},
+                      lambda repeat, count=count: bench_projectiles(500, 1000, count, repeat)))
+        cases.append(("explosive_block_explode", {"blocks": count, "enemies": 1000},
+                      lambda repeat, count=count: bench_explosions(count, 1000, repeat)))
+    for count in HOLY_WATER_COUNTS:
+        for enemy_count in (100, 1000, 10000):
+            cases.append(("area_effects_holy_water", {"pools": count, "enemies": enemy_count},
+                          lambda repeat, count=count, enemy_count=enemy_count:
+                          bench_holy_water(count, enemy_count, repeat)))
+    cases.append(("draw_map", {}, bench_draw_map))
+    for count in ENEMY_COUNTS:
+        cases.append(("draw_entities", {"enemies": count, "items": count // 10, "projectiles": PROJECTILE_COUNTS[-1]},
+                      lambda repeat, count=count: bench_draw_entities(count, repeat)))
+    for count in ENEMY_COUNTS:
+        cases.append(("draw_minimap", {"enemies": count},
+                      lambda repeat, count=count: bench_draw_minimap(count, repeat)))
+    cases.append(("hud", {}, bench_hud))
+    for stage in ("capture", "encode", "load"):
+        for count in (10, 1000, 10000):
+            cases.append((f"snapshot_{stage}", {"enemies": count},
+                          lambda repeat, stage=stage, count=count: bench_snapshot(stage, count, repeat)))
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark podsystemów gry")
+    parser.add_argument("--repeat", type=int, default=20, help="liczba powtórzeń każdego pomiaru")
+    parser.add_argument("--only", default=None, help="uruchom tylko podsystemy zawierające ten tekst")
+    parser.add_argument("--output", default=None, help="plik JSON z wynikami (domyślnie standardowe wyjście)")
+    args = parser.parse_args(argv)
+    game.init_display(headless=True)
+
+    results = []
+    for subsystem, params, bench in scenarios():
+        if args.only and args.only not in subsystem:
+            continue
+        stats = bench(args.repeat)
+        results.append({"subsystem": subsystem, "params": params, **stats})
+        label = ", ".join(f"{key}={value}" for key, value in params.items())
+        print(f"{subsystem:28} {label:45} median {stats['median_ms']:9.3f} ms", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
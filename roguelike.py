@@ -1,14 +1,27 @@
+import copy
+import csv
+import heapq
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+STARTUP_T0 = time.perf_counter()  # Początek importu (przed pygame i NumPy) do raportu startu
+
 import pygame
+import numpy as np
 import random
-
-# Inicjalizacja Pygame
-pygame.init()
+from collections import OrderedDict, deque
 
 WIDTH, HEIGHT = 800, 600  # Rozmiar ekranu
 TILE_SIZE = 32  # Rozmiar kafelka
-MAP_WIDTH, MAP_HEIGHT = 50, 50  # Rozmiar mapy w kafelkach
-VISIBLE_TILES_X = WIDTH // TILE_SIZE
-VISIBLE_TILES_Y = HEIGHT // TILE_SIZE
+MAP_WIDTH, MAP_HEIGHT = 50, 50  # Domyślny rozmiar mapy w kafelkach
+SPAWN_RADIUS = 50  # Promień wokół gracza (w kafelkach), w którym pojawiają się przeciwnicy i bloki
 
 # Kolory
 BLACK = (0, 0, 0)
@@ -18,29 +31,446 @@ GREEN = (0, 255, 0)
 RED = (255, 0, 0)
 YELLOW = (255, 255, 0)
 
+# Logowanie
+LOG_CATEGORIES = ("combat", "spawn", "loot", "progress", "game")  # Kategorie komunikatów gry
+LOG_DISABLED = logging.CRITICAL + 1  # Poziom wyłączający logowanie (domyślny)
+
+log = logging.getLogger("roguelike")
+log.setLevel(LOG_DISABLED)  # Wyłączone, dopóki nie wywołano configure_logging()
+log.propagate = False
+log.addHandler(logging.NullHandler())
+combat_log = logging.getLogger("roguelike.combat")
+spawn_log = logging.getLogger("roguelike.spawn")
+loot_log = logging.getLogger("roguelike.loot")
+progress_log = logging.getLogger("roguelike.progress")
+game_log = logging.getLogger("roguelike.game")
+
+
+class BackgroundLogWriter(logging.Handler):
+    """
+    Handler, który w wątku gry tylko odkłada rekordy do bufora kołowego.
+    Formatowanie i zapis do strumienia wykonuje wątek w tle, więc wypisywanie
+    na konsolę nigdy nie blokuje klatki. Przy przepełnieniu bufora najstarsze
+    rekordy są odrzucane (licznik dropped).
+    """
+    def __init__(self, stream=None, capacity=4096, interval=0.1):
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval  # Co ile sekund wątek opróżnia bufor
+        self.dropped = 0
+        self._buffer = deque(maxlen=capacity)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._drain()
+
+    def _drain(self):
+        lines = []
+        while self._buffer:
+            lines.append(self.format(self._buffer.popleft()))
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+
+    def flush(self):
+        self._drain()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._drain()
+        super().close()
+
+
+def configure_logging(level=logging.INFO, categories=None, stream=None, capacity=4096):
+    """
+    Włącza logowanie gry na podanym poziomie, opcjonalnie tylko dla wybranych
+    kategorii (combat, spawn, loot, progress, game). Zwraca utworzony handler.
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    log.setLevel(level)
+    for category in LOG_CATEGORIES:
+        enabled = categories is None or category in categories
+        logging.getLogger(f"roguelike.{category}").setLevel(level if enabled else LOG_DISABLED)
+
+    handler = BackgroundLogWriter(stream, capacity)
+    handler.setFormatter(logging.Formatter("%(relativeCreated)9.0f %(levelname)-7s %(name)s: %(message)s"))
+    log.addHandler(handler)
+    return handler
+
+
+# Raport startu
+class StartupTimer:
+    """
+    Czasy kolejnych etapów uruchamiania, liczone od początku importu modułu:
+    import, init (pygame i okno), first_frame (pierwsza klatka na ekranie),
+    assets (koniec wczytywania grafik w tle) i game (pierwsza klatka rozgrywki).
+    """
+    def __init__(self, start):
+        self.start = start
+        self.times = {}  # Etap -> ms od początku importu
+
+    def mark(self, phase):
+        """Zapisuje czas etapu przy pierwszym wywołaniu; kolejne są pomijane."""
+        if phase not in self.times:
+            self.times[phase] = (time.perf_counter() - self.start) * 1000
+
+    def report(self):
+        return "Start: " + ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in self.times.items())
+
+
+startup = StartupTimer(STARTUP_T0)
+
+
 # Ustawienia ekranu
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Roguelike Game")
+screen = None  # Okno gry, tworzone przez init_display()
+
+
+def init_display(headless=False):
+    """
+    Inicjalizuje pygame i tworzy okno przy pierwszym wywołaniu (import modułu
+    niczego nie inicjalizuje). W trybie headless używa sterownika SDL "dummy".
+    """
+    global screen
+    if screen is None:
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Roguelike Game")
+        startup.mark("init")
+    return screen
+
+
+# Pamięć podręczna grafik
+class AssetCache:
+    """
+    Wczytuje, konwertuje i skaluje każdy obraz tylko raz.
+    Oryginały są trzymane na stałe, a warianty (rozmiar, odbicie) w pamięci LRU.
+    preload() dekoduje pliki w wątku w tle, a konwersja i skalowanie (wywołania
+    SDL na powierzchniach) zostają w głównym wątku: w get() albo w finish_preload().
+    Dekodowanie jest chronione blokadą, więc obraz nigdy nie jest dekodowany dwa razy.
+    """
+    def __init__(self, max_variants=64):
+        self.max_variants = max_variants  # Limit przechowywanych wariantów
+        self._sources = {}  # Ścieżka -> przekonwertowany oryginał
+        self._decoded = {}  # Ścieżka -> oryginał zdekodowany w tle, jeszcze nieprzekonwertowany
+        self._preload = None  # (wątek, warianty) ostatniego preload()
+        self._variants = OrderedDict()  # (ścieżka, rozmiar, odbicie) -> Surface
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.preload_ms = None  # Czas wczytywania w tle (None - nie skończone albo nie uruchomione)
+
+    def _load_source(self, path):
+        """Dekoduje plik PNG tylko przy pierwszym użyciu."""
+        source = self._sources.get(path)
+        if source is None:
+            decoded = self._decoded.pop(path, None)
+            source = (decoded if decoded is not None else pygame.image.load(path)).convert_alpha()
+            self._sources[path] = source
+        return source
+
+    def get(self, path, size=None, flip=False):
+        """
+        Zwraca współdzieloną powierzchnię dla podanej ścieżki, rozmiaru i odbicia.
+        Zwróconej powierzchni nie wolno modyfikować.
+        """
+        if size is not None:
+            size = (int(size[0]), int(size[1]))
+        key = (path, size, flip)
+        with self._lock:
+            image = self._variants.get(key)
+            if image is not None:
+                self._variants.move_to_end(key)
+                self.hits += 1
+                return image
+
+            self.misses += 1
+            image = self._load_source(path)
+            if size is not None and image.get_size() != size:
+                image = pygame.transform.scale(image, size)
+            if flip:
+                image = pygame.transform.flip(image, True, False)
+
+            self._variants[key] = image
+            if len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)  # Usuń najdawniej używany wariant
+                self.evictions += 1
+            return image
+
+    def preload(self, specs):
+        """
+        Dekoduje pliki grafik (ścieżka, rozmiar, odbicie) w wątku w tle. Wątek nie
+        konwertuje powierzchni (SDL nie jest bezpieczne wątkowo); warianty
+        przygotowuje finish_preload() w głównym wątku.
+        """
+        def run():
+            start = time.perf_counter()
+            for path in dict.fromkeys(path for path, _, _ in specs):
+                with self._lock:
+                    if path not in self._sources and path not in self._decoded:
+                        self._decoded[path] = pygame.image.load(path)
+            self.preload_ms = (time.perf_counter() - start) * 1000
+            startup.mark("assets")
+
+        thread = threading.Thread(target=run, name="asset-preload", daemon=True)
+        self._preload = (thread, specs)
+        thread.start()
+        return thread
+
+    def finish_preload(self):
+        """Czeka na wątek preload() i w głównym wątku konwertuje i skaluje jego grafiki."""
+        if self._preload is None:
+            return
+        thread, specs = self._preload
+        self._preload = None
+        thread.join()
+        for path, size, flip in specs:
+            self.get(path, size, flip)
+
+    def stats(self):
+        """Zwraca liczniki trafień i chybień pamięci podręcznej."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "sources": len(self._sources),
+            "variants": len(self._variants),
+        }
+
+
+assets = AssetCache()
+
+
+# Pamięć podręczna czcionek i napisów
+class TextCache:
+    """
+    Wspólny rejestr czcionek i pamięć podręczna wyrenderowanych napisów.
+    Napisy są zapamiętywane po (czcionka, rozmiar, tekst, kolor) z limitem LRU.
+    """
+    def __init__(self, max_texts=256):
+        self.max_texts = max_texts  # Limit zapamiętanych napisów
+        self._fonts = {}  # (czcionka, rozmiar) -> pygame.font.Font
+        self._texts = OrderedDict()  # (czcionka, rozmiar, tekst, kolor) -> Surface
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def font(self, size, name=None):
+        """Zwraca czcionkę o podanym rozmiarze, tworząc ją tylko raz."""
+        key = (name, size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = pygame.font.Font(name, size)
+            self._fonts[key] = font
+        return font
+
+    def render(self, text, size, color, name=None):
+        """
+        Zwraca wyrenderowany (wygładzony) napis.
+        Niezmienione napisy są brane z pamięci i kosztują tylko jedno blit.
+        """
+        key = (name, size, text, color)
+        surface = self._texts.get(key)
+        if surface is not None:
+            self._texts.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.font(size, name).render(text, True, color)
+        self._texts[key] = surface
+        if len(self._texts) > self.max_texts:
+            self._texts.popitem(last=False)  # Usuń najdawniej używany napis
+            self.evictions += 1
+        return surface
+
+    def stats(self):
+        """Zwraca liczniki trafień i chybień pamięci napisów."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fonts": len(self._fonts),
+            "texts": len(self._texts),
+        }
+
+
+text_cache = TextCache()
+
+
+# Zegary gry
+TICK_RATE = 60  # Kroki logiki na sekundę (niezależnie od liczby rysowanych klatek)
+TICK_MS = 1000 / TICK_RATE  # Stały krok logiki w ms
+RENDER_FPS = 144  # Górny limit rysowanych klatek na sekundę
+MAX_FRAME_STEPS = 5  # Najwięcej kroków logiki nadrabianych przed jedną klatką
+
+
+class GameClock:
+    """Źródło czasu rzeczywistego oparte na pygame.time (napędza FixedStepClock)."""
+    def __init__(self):
+        self._clock = pygame.time.Clock()
+
+    def get_ticks(self):
+        return pygame.time.get_ticks()
+
+    def tick(self, framerate=0):
+        """Czeka do następnej klatki i zwraca czas, który upłynął (ms)."""
+        return self._clock.tick(framerate)
+
+
+class SimulatedClock:
+    """
+    Zegar logiki: czas gry rośnie o stały krok przy każdym step(), a tick()
+    zwraca liczbę kroków do wykonania przed kolejną klatką. Zegar symulowany
+    daje zawsze jeden krok, bez czekania, i rysuje stan po kroku (alpha = 1).
+    Pozwala uruchamiać logikę gry szybciej niż w czasie rzeczywistym.
+    """
+    alpha = 1.0  # Położenie rysowania między dwoma ostatnimi krokami (0..1)
+
+    def __init__(self, step_ms=TICK_MS, start_ms=0):
+        self.step_ms = step_ms  # Krok czasu logiki
+        self.time_ms = start_ms
+
+    def get_ticks(self):
+        return int(self.time_ms)
+
+    def step(self):
+        """Przesuwa czas gry o jeden krok logiki."""
+        self.time_ms += self.step_ms
+
+    def tick(self, framerate=0):
+        """Liczba kroków logiki przed kolejną klatką (zawsze jeden)."""
+        return 1
+
+    def resume(self):
+        """Wznowienie po pauzie (menu, okno dialogowe)."""
+
+
+class FixedStepClock(SimulatedClock):
+    """
+    Zegar logiki o stałym kroku napędzany czasem rzeczywistym: czas kolejnych
+    klatek trafia do akumulatora, z którego tick() wydaje całe kroki logiki,
+    a reszta (alpha) służy do interpolacji rysowania. Przy wolnej klatce
+    logika nadrabia kilka kroków naraz (najwyżej max_steps, dalej czas przepada),
+    więc gra gubi klatki zamiast zwalniać. speed to mnożnik tempa (np. odtwarzania).
+    """
+    def __init__(self, source=None, step_ms=TICK_MS, start_ms=None, speed=1, max_steps=MAX_FRAME_STEPS):
+        self.source = source if source is not None else GameClock()
+        super().__init__(step_ms, self.source.get_ticks() if start_ms is None else start_ms)
+        self.speed = speed
+        self.max_steps = max_steps
+        self.accumulator = 0.0  # Czas rzeczywisty (ms) jeszcze nieprzerobiony na kroki
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.step_ms
+
+    def tick(self, framerate=0):
+        """Czeka do następnej klatki i zwraca liczbę zaległych kroków logiki."""
+        self.accumulator += self.source.tick(framerate) * self.speed
+        steps = int(self.accumulator // self.step_ms)
+        if steps > self.max_steps:  # Przeciążenie: zaległy czas przepada
+            steps = self.max_steps
+            self.accumulator %= self.step_ms
+        else:
+            self.accumulator -= steps * self.step_ms
+        return steps
+
+    def resume(self):
+        """Czas spędzony w menu nie jest nadrabiany."""
+        self.source.tick()
+
+
+game_clock = FixedStepClock()  # Zegar używany przez całą logikę gry
+
+
+def set_clock(clock):
+    """Podmienia zegar gry (np. na SimulatedClock w trybie bez okna)."""
+    global game_clock
+    game_clock = clock
+
+
+class TimerScheduler:
+    """
+    Wspólna kolejka terminów (kopiec) dla wygasania i odliczania czasu.
+    Obiekty rejestrują termin i funkcję, a run() w każdej klatce zdejmuje
+    tylko terminy, które już minęły, zamiast odpytywać zegar w każdym obiekcie.
+    """
+    def __init__(self):
+        self._heap = []  # (termin, numer kolejny, funkcja, argumenty)
+        self._seq = 0
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule_at(self, deadline, callback, *args):
+        """Rejestruje wywołanie callback(*args) w chwili deadline (ms zegara gry)."""
+        heapq.heappush(self._heap, (deadline, self._seq, callback, args))
+        self._seq += 1
+
+    def run(self, now=None):
+        """Wywołuje wszystkie terminy <= now, w kolejności terminów i rejestracji."""
+        if now is None:
+            now = game_clock.get_ticks()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, _, callback, args = heapq.heappop(heap)
+            callback(*args)
+            self.fired += 1
+
+    def clear(self):
+        self._heap.clear()
+
+
+timers = TimerScheduler()  # Terminy bieżącej rozgrywki
 
 # Klasa Kamery
 class Camera:
-    def __init__(self, width, height):
+    def __init__(self, width, height, map_width=MAP_WIDTH, map_height=MAP_HEIGHT):
         self.width = width
         self.height = height
+        self.map_width = map_width  # Granice mapy w kafelkach
+        self.map_height = map_height
         self.x_offset = 0  # Przesunięcie kamery w osi X
         self.y_offset = 0  # Przesunięcie kamery w osi Y
+        self.prev_offset = (0, 0)  # Przesunięcie sprzed ostatniej aktualizacji (do interpolacji)
 
     def update(self, player):
         """
         Aktualizuje pozycję kamery na podstawie pozycji gracza.
         Kamera śledzi gracza i ogranicza widok do granic mapy.
         """
+        self.prev_offset = (self.x_offset, self.y_offset)
         self.x_offset = player.x * TILE_SIZE - self.width // 2 + TILE_SIZE // 2
         self.y_offset = player.y * TILE_SIZE - self.height // 2 + TILE_SIZE // 2
 
         # Ograniczenie przesunięcia kamery, aby nie wychodziła poza mapę
-        self.x_offset = max(0, min(self.x_offset, MAP_WIDTH * TILE_SIZE - self.width))
-        self.y_offset = max(0, min(self.y_offset, MAP_HEIGHT * TILE_SIZE - self.height))
+        self.x_offset = max(0, min(self.x_offset, self.map_width * TILE_SIZE - self.width))
+        self.y_offset = max(0, min(self.y_offset, self.map_height * TILE_SIZE - self.height))
+
+    def interpolated(self, alpha):
+        """Kamera do rysowania: położenie między poprzednią a bieżącą aktualizacją (alpha 0..1)."""
+        if alpha >= 1:
+            return self
+        view = copy.copy(self)
+        prev_x, prev_y = self.prev_offset
+        view.x_offset = round(prev_x + (self.x_offset - prev_x) * alpha)
+        view.y_offset = round(prev_y + (self.y_offset - prev_y) * alpha)
+        return view
 
     def apply(self, x, y):
         """
@@ -48,14 +478,36 @@ class Camera:
         """
         return x * TILE_SIZE - self.x_offset, y * TILE_SIZE - self.y_offset
 
+    def visible_tiles(self, margin=0):
+        """Zwraca zakres kafelków (x0, y0, x1, y1) widocznych przez kamerę, poszerzony o margin."""
+        return (self.x_offset // TILE_SIZE - margin,
+                self.y_offset // TILE_SIZE - margin,
+                (self.x_offset + self.width - 1) // TILE_SIZE + margin,
+                (self.y_offset + self.height - 1) // TILE_SIZE + margin)
+
 
 
 # Klasa Gracza
 class Player:
+    # Stan zapisywany w migawce (patrz GameScene.snapshot); czasy są przesuwane przy wczytaniu
+    SAVED_STATS = (
+        "x", "y", "hp", "max_hp", "damage", "attack_speed", "defense", "move_delay",
+        "holy_water_level", "holy_water_damage", "holy_water_aoe", "quest_target", "quest_progress",
+        "bats_defeated", "pending_upgrades", "exp", "level", "next_level_exp", "current_frame",
+    )
+    SAVED_TIMES = ("last_shoot_time", "last_move_time", "last_damage_time", "last_holy_water_time", "last_frame_time")
+
+    # Parametry balansu (strojone m.in. przez balance.py)
+    holy_water_damage_step = 5  # Obrażenia dodawane przez poziom Holy Water
+    holy_water_aoe_growth = 0.1  # Przyrost obszaru Holy Water na poziom (ułamek)
+    level_exp_step = 50  # Przyrost EXP wymaganego na kolejny poziom
+    holy_water_max_level = 5
+
     def __init__(self, x, y):
         # Statystyki gracza
         self.x = x
         self.y = y
+        self.prev_x, self.prev_y = x, y  # Pozycja sprzed ostatniego kroku logiki
         self.hp = 100
         self.max_hp = 100
         self.damage = 10
@@ -74,6 +526,8 @@ class Player:
         self.quest_target = random.randint(5, 15)  # Liczba nietoperzy do pokonania
         self.quest_progress = 0  # Postęp w aktualnym zadaniu
         self.bats_defeated = 0
+        self.upgrade_chooser = None  # Funkcja wybierająca nagrodę za poziom od razu (np. w benchmarku)
+        self.pending_upgrades = 0  # Nagrody czekające na wybór (GameScene.resolve_choices)
 
         # Doświadczenie
         self.exp = 0
@@ -85,41 +539,60 @@ class Player:
         self.target_size = (TILE_SIZE * 2, TILE_SIZE * 2)
 
         # Animacja chodzenia
-        self.walk_frames = [
-            pygame.transform.scale(
-                pygame.image.load(f"walk{i}.png").convert_alpha(), self.target_size
-            )
-            for i in range(1, 7)
-        ]
+        self.walk_frames = [assets.get(f"walk{i}.png", self.target_size) for i in range(1, 7)]
+        self.walk_frames_left = [assets.get(f"walk{i}.png", self.target_size, flip=True) for i in range(1, 7)]
         self.current_frame = 0
         self.image = self.walk_frames[0]  # Początkowy obraz
         self.animation_speed = 100  # Prędkość zmiany klatek (ms)
-        self.last_frame_time = pygame.time.get_ticks()
+        self.last_frame_time = game_clock.get_ticks()
         self.facing_left = False
 
         # Obraz w stanie bezruchu
-        self.idle_image = pygame.transform.scale(
-            pygame.image.load("idle.png").convert_alpha(), self.target_size
-        )
+        self.idle_image = assets.get("idle.png", self.target_size)
+        self.idle_image_left = assets.get("idle.png", self.target_size, flip=True)
+
+    def snapshot(self):
+        """Kopia zapisywanego stanu gracza (same niezmienne wartości)."""
+        return {
+            "stats": [getattr(self, name) for name in self.SAVED_STATS],
+            "times": [getattr(self, name) for name in self.SAVED_TIMES],
+            "facing_left": self.facing_left,
+            "weapons": list(self.inventory["weapons"]),
+            "shield": self.inventory["shield"],
+            "equipped_weapon": self.equipped_weapon,
+        }
+
+    @classmethod
+    def from_snapshot(cls, state, time_shift=0):
+        """Odtwarza gracza z migawki; czasy przesuwa o time_shift (ms)."""
+        stats = dict(zip(cls.SAVED_STATS, state["stats"]))
+        player = cls(stats["x"], stats["y"])
+        for name, value in stats.items():
+            setattr(player, name, value)
+        for name, value in zip(cls.SAVED_TIMES, state["times"]):
+            setattr(player, name, value + time_shift)
+        player.facing_left = state["facing_left"]
+        player.inventory = {"weapons": list(state["weapons"]), "shield": state["shield"]}
+        player.equipped_weapon = state["equipped_weapon"]
+        player.previous_weapon = player.equipped_weapon  # Bonus tej broni jest już wliczony w damage
+        return player
 
     def update_animation(self, moving):
         """Aktualizuje animację gracza."""
         if moving:  # Animacja chodzenia
-            current_time = pygame.time.get_ticks()
+            current_time = game_clock.get_ticks()
             if current_time - self.last_frame_time > 150:  # Czas między klatkami
                 self.last_frame_time = current_time
                 self.current_frame = (self.current_frame + 1) % len(self.walk_frames)
-            self.image = self.walk_frames[self.current_frame]
+            # Obrót w zależności od kierunku (odbite klatki są w pamięci podręcznej)
+            frames = self.walk_frames_left if self.facing_left else self.walk_frames
+            self.image = frames[self.current_frame]
         else:  # Obraz w stanie bezruchu
-            self.image = self.idle_image
-
-        # Obrót w zależności od kierunku
-        if self.facing_left:
-            self.image = pygame.transform.flip(self.image, True, False)
+            self.image = self.idle_image_left if self.facing_left else self.idle_image
 
     def move(self, dx, dy, game_map):
         """Ruch gracza."""
-        current_time = pygame.time.get_ticks()
+        current_time = game_clock.get_ticks()
         if current_time - self.last_move_time >= self.move_delay:
             new_x = self.x + dx
             new_y = self.y + dy
@@ -137,29 +610,28 @@ class Player:
             self.moving = False  # Gracz nie porusza się
 
     def pick_item(self, items):
-        """Zbieranie przedmiotu."""
-        for item in items[:]:
-            if self.x == item.x and self.y == item.y:
-                if item.item_type.startswith("weapon"):
-                    weapon_names = {
-                        "weapon1": "wooden sword",
-                        "weapon2": "bronze sword",
-                        "weapon3": "silver sword"
-                    }
-                    weapon_name = weapon_names.get(item.item_type, item.item_type)
-                    if weapon_name not in self.inventory["weapons"]:
-                        self.inventory["weapons"].append(weapon_name)
-                    print(f"Picked up weapon: {weapon_name}")
-                elif item.item_type == "shield1":
-                    self.inventory["shield"] = "basic shield"
-                    self.apply_shield_effect()
-                    print(f"Picked up shield: basic shield")
-                items.remove(item)
-
-    def throw_holy_water(self, holy_waters):
+        """Zbieranie przedmiotów leżących na kafelku gracza."""
+        for item in items.at(self.x, self.y):
+            if item.item_type.startswith("weapon"):
+                weapon_names = {
+                    "weapon1": "wooden sword",
+                    "weapon2": "bronze sword",
+                    "weapon3": "silver sword"
+                }
+                weapon_name = weapon_names.get(item.item_type, item.item_type)
+                if weapon_name not in self.inventory["weapons"]:
+                    self.inventory["weapons"].append(weapon_name)
+                loot_log.info("Picked up weapon: %s", weapon_name)
+            elif item.item_type == "shield1":
+                self.inventory["shield"] = "basic shield"
+                self.apply_shield_effect()
+                loot_log.info("Picked up shield: basic shield")
+            items.remove(item)
+
+    def throw_holy_water(self, effects):
         """Rzucanie Holy Water, jeśli odblokowane."""
         if self.holy_water_level > 0:  # Sprawdzamy, czy gracz odblokował umiejętność
-            current_time = pygame.time.get_ticks()
+            current_time = game_clock.get_ticks()
             if current_time - self.last_holy_water_time >= 3000:  # Rzucanie co 3 sekundy
                 self.last_holy_water_time = current_time
 
@@ -171,16 +643,29 @@ class Player:
                 holy_water_x = (self.x + dx) * TILE_SIZE
                 holy_water_y = (self.y + dy) * TILE_SIZE
 
-                # Tworzenie obiektu Holy Water
-                holy_water = HolyWater(holy_water_x, holy_water_y, self.holy_water_damage, self.holy_water_aoe)
-                holy_waters.append(holy_water)
+                # Kałuża Holy Water (obrażenia i wygaśnięcie prowadzi AreaEffects)
+                effects.add_holy_water(holy_water_x, holy_water_y, self.holy_water_damage, self.holy_water_aoe)
 
     def upgrade_holy_water(self):
         """Ulepszanie Holy Water na wyższy poziom."""
-        if self.holy_water_level < 5:  # Maksymalny poziom to 5
+        if self.holy_water_level < self.holy_water_max_level:
             self.holy_water_level += 1
-            self.holy_water_damage += 5  # Każdy poziom dodaje 5 obrażeń
-            self.holy_water_aoe += int(self.holy_water_aoe * 0.1)  # Powiększamy obszar działania o 10%
+            self.holy_water_damage += self.holy_water_damage_step  # Każdy poziom dodaje obrażenia
+            self.holy_water_aoe = self.grown_holy_water_aoe(self.holy_water_aoe)  # Powiększamy obszar działania
+
+    @classmethod
+    def grown_holy_water_aoe(cls, aoe):
+        """Obszar Holy Water po kolejnym ulepszeniu."""
+        return aoe + int(aoe * cls.holy_water_aoe_growth)
+
+    @classmethod
+    def holy_water_sizes(cls):
+        """Średnice kałuży (w pikselach) na kolejnych poziomach Holy Water."""
+        aoe, sizes = TILE_SIZE, []
+        for _ in range(cls.holy_water_max_level):
+            aoe = cls.grown_holy_water_aoe(aoe)
+            sizes.append(aoe * 2)
+        return sizes
 
     def gain_exp(self, amount):
         """Zdobywanie doświadczenia"""
@@ -192,8 +677,27 @@ class Player:
         """Awans na kolejny poziom"""
         self.exp -= self.next_level_exp
         self.level += 1
-        self.next_level_exp += 50  # Zwiększ wymagane EXP do następnego poziomu
-        self.show_level_up_dialog()
+        self.next_level_exp += self.level_exp_step  # Zwiększ wymagane EXP do następnego poziomu
+        if self.upgrade_chooser is not None:
+            self.apply_upgrade(self.upgrade_chooser(self))
+        else:
+            self.pending_upgrades += 1  # Wybór na końcu klatki
+
+    def apply_upgrade(self, choice):
+        """Zastosowanie wybranej nagrody za poziom (1: obrażenia, 2: max HP, 3: Holy Water)."""
+        if choice == 1:
+            self.damage += 5
+        elif choice == 2:
+            self.max_hp += 5
+            self.hp += 5
+        elif choice == 3 and self.holy_water_level < self.holy_water_max_level:
+            self.upgrade_holy_water()
+
+    def equip_weapon(self, index):
+        """Wyposażenie broni o podanym indeksie z ekwipunku."""
+        self.equipped_weapon = self.inventory["weapons"][index]
+        self.apply_weapon_effect()
+        loot_log.info("Wybrana broń: %s", self.equipped_weapon)
 
     def apply_weapon_effect(self):
         """Zastosowanie efektu wybranej broni."""
@@ -215,7 +719,7 @@ class Player:
         # Zaktualizuj poprzednią broń
         self.previous_weapon = self.equipped_weapon
 
-        print(f"Wybrano broń: {self.equipped_weapon}, obrażenia gracza: {self.damage}")
+        loot_log.info("Wybrano broń: %s, obrażenia gracza: %d", self.equipped_weapon, self.damage)
 
     def apply_shield_effect(self):
         """Zastosowanie efektu tarczy."""
@@ -223,13 +727,13 @@ class Player:
             self.defense = 2  # Przykładowa wartość obrony dla tarczy
         else:
             self.defense = 0  # Brak tarczy oznacza brak bonusu obrony
-        print(f"Obrona gracza została ustawiona na: {self.defense}")
+        loot_log.info("Obrona gracza została ustawiona na: %d", self.defense)
 
     def draw_inventory(self, surface):
-        """Rysowanie ekwipunku gracza w lewym górnym rogu ekranu z obrazkami."""
-        font = pygame.font.Font(None, 24)
+        """Rysowanie ekwipunku gracza w lewym górnym rogu ekranu z obrazkami. Zwraca listę zmienionych prostokątów."""
         x = 10  # Punkt początkowy blisko lewej krawędzi
         y = 10  # Punkt początkowy blisko górnej krawędzi
+        rects = []
 
         # Mapowanie broni na pliki graficzne
         weapon_images = {
@@ -240,79 +744,39 @@ class Player:
 
         # Wyświetl bronie
         for weapon in self.inventory["weapons"]:
-            weapon_text = font.render(weapon, True, WHITE)
+            weapon_text = text_cache.render(weapon, 24, WHITE)
             weapon_file = weapon_images.get(weapon)  # Pobierz nazwę pliku
             if weapon_file:
-                weapon_img = pygame.image.load(weapon_file).convert_alpha()
-                weapon_img = pygame.transform.scale(weapon_img, (32, 32))
-                surface.blit(weapon_img, (x, y))
-            surface.blit(weapon_text, (x + 40, y + 5))
+                weapon_img = assets.get(weapon_file, (32, 32))
+                rects.append(surface.blit(weapon_img, (x, y)))
+            rects.append(surface.blit(weapon_text, (x + 40, y + 5)))
             y += 40
 
         # Wyświetl aktualnie wyposażoną broń
         if self.equipped_weapon:
-            equipped_text = font.render(f"Equipped: {self.equipped_weapon}", True, WHITE)
-            surface.blit(equipped_text, (x, y))
+            equipped_text = text_cache.render(f"Equipped: {self.equipped_weapon}", 24, WHITE)
+            rects.append(surface.blit(equipped_text, (x, y)))
             y += 30  # Przesuń na kolejną linię
 
         # Wyświetl tarczę
         if self.inventory["shield"]:
-            shield_text = font.render(f"Shield: {self.inventory['shield']}", True, WHITE)
-            shield_img = pygame.image.load("shield1.png").convert_alpha()
-            shield_img = pygame.transform.scale(shield_img, (32, 32))
-            surface.blit(shield_img, (x, y))
-            surface.blit(shield_text, (x + 40, y + 5))
-
-    def show_level_up_dialog(self):
-        """Wyświetlanie okna dialogowego wyboru nagrody."""
-        font = pygame.font.Font(None, 36)
-        running = True
-        while running:
-            screen.fill(BLACK)
-
-            # Wyświetlanie opcji
-            text = font.render("Level Up! Choose an upgrade:", True, WHITE)
-            dmg_text = font.render("1: Increase Damage (+5)", True, WHITE)
-            hp_text = font.render("2: Increase Max HP (+5)", True, WHITE)
-            if self.holy_water_level < 5:
-                holy_water_text = font.render(
-                    "3: Upgrade Holy Water (+" + str(5 + self.holy_water_level) + " Damage, +10% AOE)", True, WHITE)
-
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 2 - 100))
-            screen.blit(dmg_text, (WIDTH // 2 - dmg_text.get_width() // 2, HEIGHT // 2 - 50))
-            screen.blit(hp_text, (WIDTH // 2 - hp_text.get_width() // 2, HEIGHT // 2))
-            if self.holy_water_level < 5:
-                screen.blit(holy_water_text, (WIDTH // 2 - holy_water_text.get_width() // 2, HEIGHT // 2 + 50))
-
-            pygame.display.flip()
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_1:
-                        self.damage += 5
-                        running = False
-                    elif event.key == pygame.K_2:
-                        self.max_hp += 5
-                        self.hp += 5
-                        running = False
-                    elif event.key == pygame.K_3 and self.holy_water_level < 5:
-                        self.upgrade_holy_water()
-                        running = False
+            shield_text = text_cache.render(f"Shield: {self.inventory['shield']}", 24, WHITE)
+            shield_img = assets.get("shield1.png", (32, 32))
+            rects.append(surface.blit(shield_img, (x, y)))
+            rects.append(surface.blit(shield_text, (x + 40, y + 5)))
+        return rects
 
     def check_quest_completion(self):
         """Sprawdzanie, czy zadanie zostało ukończone."""
         if self.quest_progress >= self.quest_target:
-            print(f"Quest completed! Defeat {self.quest_target} bats.")
+            progress_log.info("Quest completed! Defeat %d bats.", self.quest_target)
             self.gain_exp(self.next_level_exp // 2)  # Dodaj 50% punktów do kolejnego poziomu
             self.quest_target = random.randint(5, 15)  # Nowy cel
             self.quest_progress = 0  # Zresetuj postęp
-            print(f"New quest: Defeat {self.quest_target} bats!")
+            progress_log.info("New quest: Defeat %d bats!", self.quest_target)
 
     def draw_xp_bar(surface, player):
-        """Rysowanie paska doświadczenia."""
+        """Rysowanie paska doświadczenia. Zwraca zmieniony prostokąt."""
         bar_width = WIDTH - 20  # Szerokość paska (mniej niż szerokość ekranu)
         bar_height = 20  # Wysokość paska
         x = 10  # Odstęp od lewej krawędzi ekranu
@@ -322,28 +786,26 @@ class Player:
         xp_ratio = player.exp / player.next_level_exp
 
         # Rysowanie tła paska
-        pygame.draw.rect(surface, GRAY, (x, y, bar_width, bar_height))
+        bar_rect = pygame.draw.rect(surface, GRAY, (x, y, bar_width, bar_height))
         # Rysowanie wypełnionej części paska
         pygame.draw.rect(surface, YELLOW, (x, y, int(bar_width * xp_ratio), bar_height))
         # Rysowanie obramowania paska
         pygame.draw.rect(surface, WHITE, (x, y, bar_width, bar_height), 2)
 
         # Wyświetlanie poziomu gracza
-        font = pygame.font.Font(None, 24)
-        text = font.render(f"Level {player.level}", True, WHITE)
-        surface.blit(text, (x + 5, y - 25))
+        text = text_cache.render(f"Level {player.level}", 24, WHITE)
+        return bar_rect.union(surface.blit(text, (x + 5, y - 25)))
 
     def draw_quest_status(self, surface, minimap_x, minimap_y, minimap_width, minimap_height):
         """Rysowanie statusu zadania pod minimapą w prawym górnym rogu."""
-        font = pygame.font.Font(None, 24)
         quest_x = minimap_x  # Pozycja X zgodna z minimapą
         quest_y = minimap_y + minimap_height + 10  # Pozycja Y poniżej minimapy
 
-        quest_text = font.render(f"Quest: Defeat {self.quest_progress}/{self.quest_target} bats", True, WHITE)
-        surface.blit(quest_text, (quest_x, quest_y))
+        quest_text = text_cache.render(f"Quest: Defeat {self.quest_progress}/{self.quest_target} bats", 24, WHITE)
+        return surface.blit(quest_text, (quest_x, quest_y))
 
     def shoot(self, projectiles, direction):
-        current_time = pygame.time.get_ticks()
+        current_time = game_clock.get_ticks()
         if current_time - self.last_shoot_time >= 500:  # Strzał co 500 ms
             self.last_shoot_time = current_time
             dx, dy = direction
@@ -359,78 +821,224 @@ class Player:
             projectile_y = self.y * TILE_SIZE + TILE_SIZE * 2 // 2
 
             # Tworzenie pocisku
-            projectile = Projectile(projectile_x, projectile_y, dx, dy, speed=10)
-            projectiles.append(projectile)
+            projectiles.spawn(projectile_x, projectile_y, dx, dy, speed=10)
 
 
     def take_damage(self, damage):
         """Metoda do otrzymywania obrażeń"""
         reduced_damage = max(damage - self.defense, 0)  # Obrona zmniejsza obrażenia
         self.hp -= reduced_damage
-        print(f"Gracz otrzymał obrażenia: {reduced_damage}, HP: {self.hp}/{self.max_hp}")
+        combat_log.debug("Gracz otrzymał obrażenia: %d, HP: %d/%d", reduced_damage, self.hp, self.max_hp)
         if self.hp <= 0:
             self.hp = 0
-            print("Gracz zginął!")
+            combat_log.info("Gracz zginął!")
 
     def attack(self, enemy):
         """Metoda do atakowania przeciwnika"""
-        print(f"Atakuję przeciwnika za {self.damage} obrażeń!")
+        combat_log.debug("Atakuję przeciwnika za %d obrażeń!", self.damage)
         enemy.take_damage(self.damage)
 
     def heal(self, amount):
         """Metoda do leczenia gracza"""
         self.hp = min(self.hp + amount, self.max_hp)
-        print(f"Gracz wyleczony do {self.hp}/{self.max_hp} HP.")
+        combat_log.debug("Gracz wyleczony do %d/%d HP.", self.hp, self.max_hp)
 
 
-    def draw(self, surface, camera):
-        # Przekształć pozycję gracza w pozycję względem kamery
-        screen_x, screen_y = camera.apply(self.x, self.y)
+    def remember_position(self):
+        """Zapamiętuje pozycję sprzed kroku logiki (do interpolacji rysowania)."""
+        self.prev_x, self.prev_y = self.x, self.y
+
+    def draw(self, surface, camera, alpha=1.0):
+        # Przekształć pozycję gracza (między poprzednim a bieżącym krokiem) w pozycję względem kamery
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        screen_x, screen_y = (round(value) for value in camera.apply(x, y))
 
         # Rysuj obraz gracza
-        surface.blit(self.image, (screen_x, screen_y))
+        image_rect = surface.blit(self.image, (screen_x, screen_y))
 
         # Rysowanie paska HP nad postacią
-        pygame.draw.rect(surface, RED, (screen_x, screen_y - 10, TILE_SIZE * 2, 5))
+        bar_rect = pygame.draw.rect(surface, RED, (screen_x, screen_y - 10, TILE_SIZE * 2, 5))
         pygame.draw.rect(surface, GREEN, (screen_x, screen_y - 10, TILE_SIZE * 2 * (self.hp / self.max_hp), 5))
+        return image_rect.union(bar_rect)
 
-class HolyWater:
-    def __init__(self, x, y, damage, aoe):
-        self.x = x
-        self.y = y
-        self.damage = damage
-        self.aoe = aoe  # Promień działania
-        self.duration = 20000  # Czas trwania w ms
-        self.start_time = pygame.time.get_ticks()  # Moment rzutu
-
-        # Ładowanie obrazu Holy Water
-        self.image = pygame.image.load("holywater.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (self.aoe * 2, self.aoe * 2))  # Dopasowanie do rozmiaru AOE
+class AreaEffects:
+    """
+    Wszystkie strefy obrażeń obszarowych (kałuże Holy Water, wybuchy bloków)
+    trzymane razem jako kolumny tablic NumPy. Strefa działa do end_time
+    i uderza co interval ms (interval 0 - tylko raz). Trafienia wszystkich
+    stref, którym przypadł termin, są liczone jednym przebiegiem: kwadraty
+    odległości stref od przeciwników z ich okien we wspólnym indeksie roju.
+    Obrazy kałuż tej samej średnicy są wspólne (AssetCache).
+    """
+    COLUMNS = (
+        ("x", np.float64),  # Środek strefy w układzie pozycji przeciwników (kafelki)
+        ("y", np.float64),
+        ("radius", np.float64),  # Promień koła albo połowa boku kwadratu (kafelki)
+        ("square", np.bool_),  # Kwadrat (wybuch) zamiast koła
+        ("damage", np.int64),  # Obrażenia jednego uderzenia
+        ("interval", np.int64),  # Odstęp między uderzeniami w ms (0 - jedno uderzenie)
+        ("next_tick", np.int64),  # Czas najbliższego uderzenia
+        ("end_time", np.int64),  # Koniec działania (włącznie)
+        ("size", np.int32),  # Średnica obrazu kałuży w pikselach (0 - bez obrazu)
+    )
+    TIME_COLUMNS = ("next_tick", "end_time")
+    CENTER = (TILE_SIZE * 3) // 2 / TILE_SIZE  # Środek przeciwnika leży 1.5 kafelka od jego pozycji
+
+    # Parametry balansu (strojone m.in. przez balance.py)
+    holy_water_duration = 20000  # Czas działania kałuży w ms
+    holy_water_interval = 250  # Co ile ms kałuża zadaje obrażenia
+    explosion_damage = 50  # Obrażenia wybuchu bloku
+
+    def __init__(self, capacity=16):
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.count = 0  # Liczba aktywnych stref (zajmują początek tablic)
+
+    def __len__(self):
+        return self.count
+
+    def snapshot(self):
+        """Kopie kolumn aktywnych stref."""
+        return tuple(getattr(self, name)[:self.count].copy() for name, _ in self.COLUMNS)
+
+    def restore(self, columns, time_shift=0):
+        """Dodaje strefy zapisane przez snapshot(); czasy przesuwa o time_shift (ms)."""
+        count = len(columns[0])
+        while len(self.x) < self.count + count:
+            self._grow()
+        for (name, _), values in zip(self.COLUMNS, columns):
+            if name in self.TIME_COLUMNS:
+                values = values + time_shift
+            getattr(self, name)[self.count:self.count + count] = values
+        self.count += count
+
+    def _grow(self):
+        """Podwaja pojemność tablic."""
+        capacity = len(self.x) * 2
+        for name, dtype in self.COLUMNS:
+            column = np.zeros(capacity, dtype=dtype)
+            column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+
+    def add(self, x, y, radius, damage, duration, interval=0, square=False, size=0):
+        """Dodaje strefę (pozycja i promień w kafelkach); pierwsze uderzenie przy najbliższym update()."""
+        if self.count == len(self.x):
+            self._grow()
+        i = self.count
+        now = game_clock.get_ticks()
+        self.x[i], self.y[i], self.radius[i], self.square[i] = x, y, radius, square
+        self.damage[i], self.interval[i], self.size[i] = damage, interval, size
+        self.next_tick[i] = now
+        self.end_time[i] = now + duration
+        self.count += 1
+
+    def add_holy_water(self, x, y, damage, aoe):
+        """
+        Kałuża Holy Water o środku (x, y) i promieniu aoe w pikselach. Obrażenia
+        są podane na krok logiki (kałuża raniła w każdym kroku), więc jedno
+        uderzenie co holy_water_interval ms zadaje ich tyle, ile zebrałoby się
+        przez ten czas - zmiana odstępu nie zmienia obrażeń na sekundę.
+        """
+        strike = round(damage * self.holy_water_interval / TICK_MS)
+        self.add(x / TILE_SIZE - self.CENTER, y / TILE_SIZE - self.CENTER, aoe / TILE_SIZE, strike,
+                 self.holy_water_duration, self.holy_water_interval, size=aoe * 2)
+
+    def add_explosion(self, x, y, explosion_range):
+        """Jednorazowy wybuch w kwadracie kafelków o środku (x, y)."""
+        self.add(x, y, explosion_range, self.explosion_damage, 0, square=True)
+
+    def clear(self):
+        self.count = 0
+
+    def _keep(self, alive):
+        """Zostawia tylko strefy oznaczone w masce, zachowując ich kolejność."""
+        kept = int(np.count_nonzero(alive))
+        if kept != self.count:
+            for name, _ in self.COLUMNS:
+                column = getattr(self, name)
+                column[:kept] = column[:self.count][alive]
+            self.count = kept
+
+    def update(self, enemies, player):
+        """
+        Zadaje obrażenia strefami, którym przypadł termin uderzenia, i usuwa
+        wygasłe. Krok logiki dłuższy niż odstęp stref zadaje naraz wszystkie
+        zaległe uderzenia (do końca działania strefy), więc obrażenia na sekundę
+        nie zależą od długości kroku.
+        """
+        now = game_clock.get_ticks()
+        n = self.count
+        due = np.flatnonzero(self.next_tick[:n] <= np.minimum(self.end_time[:n], now))
+        killed = []
+        if len(due):
+            interval = self.interval[due]
+            last = np.minimum(self.end_time[due], now)
+            strikes = np.where(interval > 0, (last - self.next_tick[due]) // np.maximum(interval, 1) + 1, 1)
+            self.next_tick[due] += strikes * interval
+            self.end_time[due[interval == 0]] = now - 1  # Jednorazowe strefy znikają po uderzeniu
+            killed = self._strike(due, strikes, enemies, player)
+        self._keep(self.end_time[:self.count] >= now)
+        for enemy in killed:
+            enemies.remove(enemy)  # Usuń przeciwnika z listy
+            player.gain_exp(20)  # Przyznaj doświadczenie graczowi
+            player.quest_progress += 1  # Zwiększ postęp zadania
+            player.check_quest_completion()  # Sprawdź, czy zadanie jest ukończone
+
+    def _strike(self, zones, strikes, enemies, player):
+        """
+        Uderzenie podanych stref naraz, każdej strikes razy. Kandydaci z okien
+        kafelków wszystkich stref pochodzą ze wspólnego indeksu roju
+        (EnemyGroup.query_windows); koła odsiewa kwadrat odległości (okno
+        kwadratu jest dokładne), a obrażenia są sumowane na przeciwnika.
+        """
+        x, y, radius = self.x[zones], self.y[zones], self.radius[zones]
+        zone, found = enemies.query_windows(
+            np.ceil(x - radius).astype(np.int64), np.ceil(y - radius).astype(np.int64),
+            np.floor(x + radius).astype(np.int64), np.floor(y + radius).astype(np.int64),
+        )
+        dx = enemies.x[found] - x[zone]
+        dy = enemies.y[found] - y[zone]
+        reach = radius[zone]
+        hits = self.square[zones][zone] | (dx * dx + dy * dy <= reach * reach)
+        damage = self.damage[zones] * strikes
+        total = np.bincount(found[hits], weights=damage[zone[hits]], minlength=len(enemies.x))
+        hit = np.flatnonzero(total > 0)  # Zabici w kolejności wierszy
+        return enemies.damage_slots(hit, total[hit].astype(np.int64), player)
 
     def draw(self, surface, camera):
-        """Rysowanie Holy Water na ekranie."""
-        screen_x = self.x - camera.x_offset
-        screen_y = self.y - camera.y_offset
-        # Rysowanie obrazu Holy Water na ekranie
-        surface.blit(self.image, (screen_x - self.aoe, screen_y - self.aoe))
-
-    def is_active(self):
-        """Sprawdzenie, czy Holy Water jeszcze działa."""
-        current_time = pygame.time.get_ticks()
-        return current_time - self.start_time <= self.duration
-
-    def check_collision(self, enemies, player):
-        """Zadawanie obrażeń przeciwnikom w obszarze działania."""
-        for enemy in enemies[:]:  # Przechodzimy przez listę przeciwników
-            enemy_center_x, enemy_center_y = enemy.get_center()
-            distance = ((self.x - enemy_center_x) ** 2 + (self.y - enemy_center_y) ** 2) ** 0.5
-            if distance <= self.aoe:
-                enemy.take_damage(self.damage, player)  # Dodano przekazanie player
-                if enemy.hp <= 0:  # Jeśli przeciwnik zginął
-                    enemies.remove(enemy)  # Usuń przeciwnika z listy
-                    player.gain_exp(20)  # Przyznaj doświadczenie graczowi
-                    player.quest_progress += 1  # Zwiększ postęp zadania
-                    player.check_quest_completion()  # Sprawdź, czy zadanie jest ukończone
+        """Rysuje widoczne kałuże Holy Water. Zwraca listę zmienionych prostokątów."""
+        n = self.count
+        sizes = self.size[:n]
+        screen_x = np.rint((self.x[:n] + self.CENTER) * TILE_SIZE).astype(np.int64) - camera.x_offset - sizes // 2
+        screen_y = np.rint((self.y[:n] + self.CENTER) * TILE_SIZE).astype(np.int64) - camera.y_offset - sizes // 2
+        visible = ((sizes > 0) & (-sizes < screen_x) & (screen_x < camera.width) &
+                   (-sizes < screen_y) & (screen_y < camera.height))
+        return surface.blits([(assets.get("holywater.png", (size, size)), (sx, sy)) for size, sx, sy in
+                              zip(sizes[visible].tolist(), screen_x[visible].tolist(), screen_y[visible].tolist())])
+
+EXPLOSION_RANGE = 5  # Zasięg eksplozji w kafelkach
+_explosion_kernels = {}  # Zasięg -> przesunięcia kafelków objętych eksplozją
+
+
+def explosion_kernel(explosion_range):
+    """Zwraca (liczone raz) przesunięcia kafelków kwadratu eksplozji o danym zasięgu."""
+    kernel = _explosion_kernels.get(explosion_range)
+    if kernel is None:
+        kernel = [
+            (dx, dy)
+            for dx in range(-explosion_range, explosion_range + 1)
+            for dy in range(-explosion_range, explosion_range + 1)
+        ]
+        _explosion_kernels[explosion_range] = kernel
+    return kernel
+
+
+def explosion_bounds(x, y, explosion_range, map_width, map_height):
+    """Zwraca granice (lewo, góra, prawo, dół) eksplozji przycięte do mapy, włącznie."""
+    return (max(0, x - explosion_range), max(0, y - explosion_range),
+            min(map_width - 1, x + explosion_range), min(map_height - 1, y + explosion_range))
+
 
 class ExplosiveBlock:
     def __init__(self, x, y):
@@ -440,118 +1048,108 @@ class ExplosiveBlock:
         self.explosion_time = None  # Czas rozpoczęcia eksplozji
         self.explosion_duration = 1000  # Czas trwania eksplozji w ms
         self.explosion_tiles = []  # Pola objęte eksplozją
+        self.on_finished = None  # Wywoływane z blokiem po końcu eksplozji (np. usunięcie z indeksu)
 
-        # Załaduj obrazek bloku wybuchającego
-        self.block_image = pygame.image.load("explo.png").convert_alpha()
-        self.block_image = pygame.transform.scale(self.block_image, (TILE_SIZE, TILE_SIZE))
+        # Obrazki bloku wybuchającego i eksplozji
+        self.block_image = assets.get("explo.png", (TILE_SIZE, TILE_SIZE))
+        self.explosion_image = assets.get("explo2.png", (TILE_SIZE, TILE_SIZE))
 
-        # Załaduj obrazek eksplozji
-        self.explosion_image = pygame.image.load("explo2.png").convert_alpha()
-        self.explosion_image = pygame.transform.scale(self.explosion_image, (TILE_SIZE, TILE_SIZE))
+    def sprites(self, camera):
+        """Zwraca pary (obraz, pozycja na ekranie) bloku albo jego eksplozji, tylko z widocznych kafelków."""
+        x0, y0, x1, y1 = camera.visible_tiles()
+        if self.is_active:
+            # Blok, jeśli jest aktywny
+            if x0 <= self.x <= x1 and y0 <= self.y <= y1:
+                return [(self.block_image, camera.apply(self.x, self.y))]
+        elif self.explosion_time is not None:
+            # Eksplozja trwa, dopóki finish_explosion (timers) jej nie zakończy
+            return [(self.explosion_image, camera.apply(x, y))
+                    for x, y in self.explosion_tiles if x0 <= x <= x1 and y0 <= y <= y1]
+        return []
 
     def draw(self, surface, camera):
-        if self.is_active:
-            # Rysuj blok, jeśli jest aktywny
-            screen_x, screen_y = camera.apply(self.x, self.y)
-            surface.blit(self.block_image, (screen_x, screen_y))
-        elif self.explosion_time:
-            # Rysuj eksplozję, jeśli została zainicjowana
-            current_time = pygame.time.get_ticks()
-            if current_time - self.explosion_time <= self.explosion_duration:
-                for tile in self.explosion_tiles:
-                    screen_x, screen_y = camera.apply(tile[0], tile[1])
-                    surface.blit(self.explosion_image, (screen_x, screen_y))
-
-    def explode(self, enemies, player):
+        """Rysuje blok albo jego eksplozję. Zwraca listę zmienionych prostokątów."""
+        return surface.blits(self.sprites(camera))
+
+    def explode(self, effects, map_width=MAP_WIDTH, map_height=MAP_HEIGHT):
         if not self.is_active:
             return
 
         self.is_active = False
-        self.explosion_time = pygame.time.get_ticks()  # Zapisz czas rozpoczęcia eksplozji
-        explosion_range = 5
+        self.explosion_time = game_clock.get_ticks()  # Zapisz czas rozpoczęcia eksplozji
+        timers.schedule_at(self.explosion_time + self.explosion_duration + 1, self.finish_explosion)
 
-        # Określ pola objęte eksplozją
+        # Określ pola objęte eksplozją (gotowy wzorzec przycięty do mapy)
+        left, top, right, bottom = explosion_bounds(self.x, self.y, EXPLOSION_RANGE, map_width, map_height)
         self.explosion_tiles = [
             (self.x + dx, self.y + dy)
-            for dx in range(-explosion_range, explosion_range + 1)
-            for dy in range(-explosion_range, explosion_range + 1)
-            if 0 <= self.x + dx < MAP_WIDTH and 0 <= self.y + dy < MAP_HEIGHT
+            for dx, dy in explosion_kernel(EXPLOSION_RANGE)
+            if left <= self.x + dx <= right and top <= self.y + dy <= bottom
         ]
 
-        for enemy in enemies[:]:
-            if (enemy.x, enemy.y) in self.explosion_tiles:
-                enemy.take_damage(50, player)  # Przekazanie player jako argument
-                if enemy.hp <= 0:
-                    enemies.remove(enemy)
-                    player.gain_exp(20)
-                    player.quest_progress += 1  # Zwiększ postęp zadania
-                    player.check_quest_completion()  # Sprawdź, czy zadanie jest ukończone
+        # Obrażenia zadaje strefa wybuchu (razem z pozostałymi strefami w AreaEffects.update)
+        effects.add_explosion(self.x, self.y, EXPLOSION_RANGE)
 
-    def update(self):
-        """Sprawdź, czy eksplozja się zakończyła."""
-        if self.explosion_time:
-            current_time = pygame.time.get_ticks()
-            if current_time - self.explosion_time > self.explosion_duration:
-                self.explosion_time = None  # Eksplozja zakończona
+    def finish_explosion(self):
+        """Koniec eksplozji (wywoływane przez timers)."""
+        self.explosion_time = None
+        if self.on_finished is not None:
+            self.on_finished(self)
 
-class Enemy:
-    def __init__(self, x, y, hp, damage):
-        self.x = x
-        self.y = y
-        self.hp = hp
-        self.damage = damage
-        self.move_delay = 500  # Czas między ruchami w ms
-        self.last_move_time = pygame.time.get_ticks()
-        self.respawn_delay = random.randint(1000, 3000)
-        self.last_respawn_time = pygame.time.get_ticks()
-        self.is_dead = False  # Czy przeciwnik jest martwy
-        self.drop_chance = 1  # Szansa na zrzucenie przedmiotu (30%)
-
-        # Rozmiar docelowy dla wszystkich klatek animacji
-        self.target_size = (TILE_SIZE * 2, TILE_SIZE * 2)
+def _swarm_column(name, kind=int):
+    """Właściwość widoku Enemy odczytująca i zapisująca jedną kolumnę roju."""
+    def get(self):
+        return kind(getattr(self.swarm, name)[self.slot])
 
-        # Animacja chodzenia
-        self.walk_frames = [
-            pygame.transform.scale(
-                pygame.image.load(f"enemywalk{i}.png").convert_alpha(), self.target_size
-            )
-            for i in range(1, 4)  # enemywalk1.png, enemywalk2.png, enemywalk3.png
-        ]
-        self.current_frame = 0
-        self.image = self.walk_frames[0]  # Początkowy ,obraz
-        self.animation_speed = 100  # Czas między klatkami w ms
-        self.last_frame_time = pygame.time.get_ticks()
+    def set(self, value):
+        getattr(self.swarm, name)[self.slot] = value
+
+    return property(get, set)
+
+
+class Enemy:
+    """
+    Lekki widok jednego przeciwnika z roju (EnemyGroup).
+    Stan nie jest trzymany w obiekcie, tylko w wierszu slot tablic roju,
+    więc hurtowe operacje roju i metody widoku widzą te same dane.
+    """
+    __slots__ = ("swarm", "slot")
+
+    move_delay = 500  # Czas między ruchami w ms
+    drop_chance = 1  # Szansa na zrzucenie przedmiotu (30%)
+    animation_speed = 100  # Czas między klatkami w ms
+    target_size = (TILE_SIZE * 2, TILE_SIZE * 2)  # Rozmiar docelowy klatek animacji
+
+    def __init__(self, swarm, slot):
+        self.swarm = swarm
+        self.slot = slot
+
+    x = _swarm_column("x")
+    y = _swarm_column("y")
+    hp = _swarm_column("hp")
+    damage = _swarm_column("damage")
+    is_dead = _swarm_column("is_dead", bool)
+    last_move_time = _swarm_column("last_move_time")
+    last_frame_time = _swarm_column("last_frame_time")
+    last_respawn_time = _swarm_column("last_respawn_time")
+    respawn_delay = _swarm_column("respawn_delay")
+    current_frame = _swarm_column("frame")
+
+    @property
+    def walk_frames(self):
+        return self.swarm.walk_frames
+
+    @property
+    def image(self):
+        return self.swarm.walk_frames[self.swarm.frame[self.slot]]
 
     def drop_item(self, items):
         """Losowanie i dodawanie przedmiotu po śmierci."""
-        print(f"Przeciwnik zginął na pozycji ({self.x}, {self.y})")
+        combat_log.debug("Przeciwnik zginął na pozycji (%d, %d)", self.x, self.y)
         if random.random() < self.drop_chance:
             item_type = random.choice(["weapon1", "weapon2", "weapon3", "shield1"])
-            items.append(Item(self.x, self.y, item_type))
-            print(f"Przedmiot {item_type} został zrzucony na pozycji ({self.x}, {self.y})")
-    def update_animation(self):
-        """Aktualizuje animację przeciwnika."""
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_frame_time >= self.animation_speed:
-            self.last_frame_time = current_time
-            self.current_frame = (self.current_frame + 1) % len(self.walk_frames)
-            self.image = self.walk_frames[self.current_frame]
-
-    def move_towards_player(self, player):
-        """Poruszanie się przeciwnika w kierunku gracza."""
-        if self.is_dead:
-            return
-
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_move_time >= self.move_delay:
-            self.last_move_time = current_time
-            dx = player.x - self.x
-            dy = player.y - self.y
-
-            if abs(dx) > abs(dy):
-                self.x += 1 if dx > 0 else -1
-            else:
-                self.y += 1 if dy > 0 else -1
+            items.append(item_pool.acquire(self.x, self.y, item_type))
+            loot_log.info("Przedmiot %s został zrzucony na pozycji (%d, %d)", item_type, self.x, self.y)
 
     def take_damage(self, damage, player):
         """Otrzymanie obrażeń"""
@@ -559,484 +1157,2415 @@ class Enemy:
             return  # Martwy przeciwnik nie otrzymuje obrażeń
 
         self.hp -= damage
-        print(f"Przeciwnik otrzymał {damage} obrażeń. Pozostało HP: {self.hp}")
+        combat_log.debug("Przeciwnik otrzymał %d obrażeń. Pozostało HP: %d", damage, self.hp)
         if self.hp <= 0:
             self.is_dead = True  # Oznacz jako martwego
-            self.last_respawn_time = pygame.time.get_ticks()  # Ustaw czas "śmierci"
+            self.last_respawn_time = game_clock.get_ticks()  # Ustaw czas "śmierci"
             player.bats_defeated += 1  # Zwiększ licznik pokonanych nietoperzy
-            print(f"Przeciwnik zginął! Liczba pokonanych nietoperzy: {player.bats_defeated}")
-
-    def should_respawn(self):
-        """Sprawdzenie, czy przeciwnik powinien się zrespawnować"""
-        current_time = pygame.time.get_ticks()
-        return self.is_dead and (current_time - self.last_respawn_time >= self.respawn_delay)
-
-    def respawn(self, width, height):
-        """Respawn przeciwnika w nowej losowej pozycji"""
-        self.x = random.randint(0, width - 1)
-        self.y = random.randint(0, height - 1)
-        self.hp = 50  # Reset HP
-        self.is_dead = False  # Przywróć do życia
-        print(f"Przeciwnik zrespawnował się w pozycji ({self.x}, {self.y})")
+            combat_log.info("Przeciwnik zginął! Liczba pokonanych nietoperzy: %d", player.bats_defeated)
 
     def attack(self, player):
-        print(f"Przeciwnik atakuje za {self.damage} obrażeń!")
+        combat_log.debug("Przeciwnik atakuje za %d obrażeń!", self.damage)
         player.take_damage(self.damage)
 
-    def get_center(self):
-        """Zwraca współrzędne środka obrazu przeciwnika."""
-        center_x = self.x * TILE_SIZE + (TILE_SIZE * 3) // 2
-        center_y = self.y * TILE_SIZE + (TILE_SIZE * 3) // 2
-        return center_x, center_y
-
     def draw(self, surface, camera):
-        self.update_animation()  # Aktualizuj animację przed rysowaniem
         screen_x, screen_y = camera.apply(self.x, self.y)
-        surface.blit(self.image, (screen_x, screen_y))
+        return surface.blit(self.image, (screen_x, screen_y))
+
+
+class FlowField:
+    """
+    Wspólne pole przepływu dla całej hordy: jedno przeszukiwanie wszerz (BFS)
+    od kafelka gracza, liczone tylko wtedy, gdy gracz zmieni kafelek.
+    Dla każdego kafelka w promieniu max_distance zapisany jest jednobajtowy
+    kod następnego kroku, więc każdy przeciwnik odczytuje swój ruch w O(1).
+    Skały (kafelki 1) są omijane.
+    """
+    # Kod kierunku -> krok (dx, dy); 0 oznacza kafelek poza polem
+    STEP_DX = np.array([0, 1, -1, 0, 0, 0])
+    STEP_DY = np.array([0, 0, 0, 1, -1, 0])
+    TARGET = 5  # Kod kafelka gracza
+    BACK = np.array([2, 1, 4, 3], dtype=np.uint8)  # Sąsiad z prawej, lewej, dołu, góry -> kod kroku do środka
+    _WALKABLE = bytes(0 if tile == 1 else 1 for tile in range(256))  # Kafelek -> czy przejezdny
+
+    def __init__(self, max_distance=48):
+        self.max_distance = max_distance  # Promień obszaru liczonego wokół gracza (w kafelkach)
+        self.directions = np.zeros(0, dtype=np.uint8)  # Kody kierunków dla okna pola (wierszami)
+        self.left = self.top = 0  # Lewy górny róg okna na mapie
+        self.width = self.height = 0  # Rozmiar okna
+        self.rebuilds = 0
+        self._origin = None  # Kafelek gracza, dla którego policzono pole
+        self._map = None
+
+    def invalidate(self):
+        """Wymusza przeliczenie pola (np. po zmianie kafelków mapy)."""
+        self._map = None
+
+    def update(self, game_map, target_x, target_y):
+        """Przelicza pole, jeśli gracz zmienił kafelek albo mapa jest inna."""
+        if self._map is game_map and self._origin == (target_x, target_y):
+            return
+        self._build(game_map, target_x, target_y)
+
+    def _build(self, game_map, target_x, target_y):
+        map_width, map_height = len(game_map[0]), len(game_map)
+        left = max(0, target_x - self.max_distance)
+        top = max(0, target_y - self.max_distance)
+        right = min(map_width - 1, target_x + self.max_distance)
+        bottom = min(map_height - 1, target_y + self.max_distance)
+        width, height = right - left + 1, bottom - top + 1
+
+        # Przejezdność okna: trawa tak, skały nie
+        walkable = bytearray()
+        for y in range(top, bottom + 1):
+            walkable += bytes(game_map[y][left:right + 1]).translate(self._WALKABLE)
+
+        # Okno z ramką nieprzejezdnych kafelków: sąsiedzi nigdy nie wychodzą poza tablicę
+        row = width + 2
+        open_tiles = np.zeros((height + 2, row), dtype=bool)  # Przejezdne i jeszcze nieodwiedzone
+        open_tiles[1:-1, 1:-1] = np.frombuffer(walkable, dtype=np.uint8).reshape(height, width) != 0
+        open_tiles = open_tiles.ravel()
+        directions = np.zeros(open_tiles.size, dtype=np.uint8)
+        if 0 <= target_x - left < width and 0 <= target_y - top < height:
+            start = (target_y - top + 1) * row + (target_x - left + 1)
+            directions[start] = self.TARGET
+            open_tiles[start] = False
+            # BFS warstwami: cała kolejka jednej odległości naraz, w tej samej
+            # kolejności co zwykła kolejka FIFO (sąsiedzi: prawy, lewy, dolny, górny)
+            offsets = np.array([1, -1, row, -row])
+            frontier = np.array([start])
+            claim = np.empty(open_tiles.size, dtype=np.intp)  # Kafelek -> najwcześniejsza pozycja w warstwie
+            while frontier.size:
+                neighbours = (frontier[:, None] + offsets).ravel()
+                found = np.flatnonzero(open_tiles[neighbours])
+                neighbours = neighbours[found]
+                # Kafelek osiągalny z kilku stron bierze krok od pierwszego w kolejce
+                order = np.arange(neighbours.size)
+                claim[neighbours] = neighbours.size
+                np.minimum.at(claim, neighbours, order)
+                first = np.flatnonzero(claim[neighbours] == order)
+                frontier = neighbours[first]
+                open_tiles[frontier] = False
+                directions[frontier] = self.BACK[found[first] & 3]  # Krok prowadzący z powrotem
+        directions = directions.reshape(height + 2, row)[1:-1, 1:-1].ravel()
+
+        self.directions = directions
+        self.left, self.top, self.width, self.height = left, top, width, height
+        self._origin = (target_x, target_y)
+        self._map = game_map
+        self.rebuilds += 1
+
+    def steps(self, xs, ys):
+        """
+        Krok (dx, dy) w stronę gracza dla tablic pozycji.
+        Zwraca (dx, dy, found); found jest fałszywe dla kafelków poza polem.
+        """
+        local_x = xs - self.left
+        local_y = ys - self.top
+        inside = (local_x >= 0) & (local_x < self.width) & (local_y >= 0) & (local_y < self.height)
+        codes = np.zeros(len(xs), dtype=np.uint8)
+        if self.directions.size:
+            codes[inside] = self.directions[local_y[inside] * self.width + local_x[inside]]
+        return self.STEP_DX[codes], self.STEP_DY[codes], codes != 0
+
+
+class TileIndex:
+    """
+    Indeks zajętości kafelków: kafelek -> leżące na nim obiekty
+    (przedmioty, bloki wybuchowe). Zachowuje kolejność dodawania do rysowania.
+    """
+    def __init__(self, pool=None):
+        self.pool = pool  # Pula, do której wracają usunięte obiekty (opcjonalnie)
+        self._tiles = {}  # (x, y) -> lista obiektów
+        self._objects = {}  # obiekt -> None (kolejność dodawania)
+        self._keys = None  # Zapamiętana tablica kluczy zajętych kafelków
+
+    def append(self, obj):
+        self._tiles.setdefault((obj.x, obj.y), []).append(obj)
+        self._objects[obj] = None
+        self._keys = None
+
+    def remove(self, obj):
+        del self._objects[obj]
+        tile = (obj.x, obj.y)
+        bucket = self._tiles[tile]
+        bucket.remove(obj)
+        if not bucket:
+            del self._tiles[tile]
+        self._keys = None
+        if self.pool is not None:
+            self.pool.release(obj)
+
+    def at(self, x, y):
+        """Zwraca kopię listy obiektów na kafelku (x, y)."""
+        return list(self._tiles.get((x, y), ()))
+
+    def query_rect(self, x0, y0, x1, y1):
+        """
+        Zwraca obiekty z kafelków od (x0, y0) do (x1, y1) włącznie.
+        Przegląda obszar albo zajęte kafelki, zależnie od tego, czego jest mniej.
+        """
+        tiles = self._tiles
+        if (x1 - x0 + 1) * (y1 - y0 + 1) < len(tiles):
+            found = [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1) if (x, y) in tiles]
+        else:
+            found = [tile for tile in tiles if x0 <= tile[0] <= x1 and y0 <= tile[1] <= y1]
+        return [obj for tile in found for obj in tiles[tile]]
+
+    def tile_keys(self, row_width):
+        """Zwraca tablicę kluczy y * row_width + x zajętych kafelków (do hurtowych porównań)."""
+        if self._keys is None or self._keys[0] != row_width:
+            keys = np.array([y * row_width + x for x, y in self._tiles], dtype=np.int64)
+            self._keys = (row_width, keys)
+        return self._keys[1]
+
+    def __iter__(self):
+        return iter(list(self._objects))
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __getitem__(self, index):
+        return list(self._objects)[index]
+
+
+class EnemyGroup:
+    """
+    Rój przeciwników: stan wszystkich przeciwników trzymany w kolumnach tablic
+    NumPy (pozycja, HP, liczniki czasu, klatka animacji). Ruch, animacja,
+    obrażenia i wykrywanie śmierci są liczone hurtowo; Enemy to tylko widok
+    na jeden wiersz. Wiersze usuniętych przeciwników są ponownie zajmowane.
+    Zapytania przestrzenne (pociski, strefy, kontakt z graczem) korzystają
+    ze wspólnego indeksu: wierszy posortowanych po kluczu kafelka.
+    """
+    COLUMNS = (
+        ("x", np.int32),
+        ("y", np.int32),
+        ("hp", np.int64),
+        ("damage", np.int32),
+        ("is_dead", np.bool_),
+        ("last_move_time", np.int64),
+        ("last_frame_time", np.int64),
+        ("last_respawn_time", np.int64),
+        ("respawn_delay", np.int32),
+        ("frame", np.int8),
+        ("order", np.int64),  # Numer kolejny dodania (kolejność rysowania)
+        ("active", np.bool_),  # Czy wiersz jest zajęty
+        ("prev_x", np.int32),  # Pozycja sprzed ostatniego kroku logiki (do interpolacji rysowania)
+        ("prev_y", np.int32),
+    )
+    SAVED_COLUMNS = COLUMNS[:11]  # Kolumny zapisywane w migawce (bez active)
+    TIME_COLUMNS = ("last_move_time", "last_frame_time", "last_respawn_time")
+    ROW = 1 << 32  # Klucz kafelka: y * ROW + x (x przeciwnika jest nieujemne)
+
+    def __init__(self, capacity=64, max_capacity=None):
+        self.max_capacity = max_capacity  # Najwięcej wierszy (None - bez limitu); pełny rój odrzuca spawn()
+        if max_capacity is not None:
+            capacity = min(capacity, max_capacity)
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self._views = [None] * capacity  # Wiersz -> widok Enemy
+        self._free = list(range(capacity - 1, -1, -1))  # Wolne wiersze (najniższe na końcu)
+        self._recycled = 0  # Ile wierszy z końca _free zwolnił remove() (są zajmowane najpierw)
+        self._order = {}  # Widok -> None (kolejność dodawania)
+        self._spawned = 0
+        self._index = None  # (wiersze, klucze) posortowane po kluczu kafelka; None - do przeliczenia
+        self.walk_frames = None  # Klatki animacji wspólne dla całego roju
+        self.reused = 0  # Dodania do wiersza zwolnionego przez remove()
+        self.fresh = 0  # Dodania do nieużywanego jeszcze wiersza
+        self.refused = 0  # Dodania odrzucone przy pełnym roju
+        self.grows = 0
+
+    def _grow(self, new_capacity):
+        capacity = len(self.x)
+        for name, dtype in self.COLUMNS:
+            column = np.zeros(new_capacity, dtype=dtype)
+            column[:capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self._views.extend([None] * (new_capacity - capacity))
+        self._free[:0] = range(new_capacity - 1, capacity - 1, -1)
+        self.grows += 1
+
+    def _load_frames(self):
+        if self.walk_frames is None:
+            self.walk_frames = [
+                assets.get(f"enemywalk{i}.png", Enemy.target_size)
+                for i in range(1, 4)  # enemywalk1.png, enemywalk2.png, enemywalk3.png
+            ]
+
+    def reset_slot(self, slot, x, y, hp, damage):
+        """Wypełnia wiersz stanem świeżo utworzonego przeciwnika."""
+        now = game_clock.get_ticks()
+        self.x[slot] = self.prev_x[slot] = x
+        self.y[slot] = self.prev_y[slot] = y
+        self.hp[slot] = hp
+        self.damage[slot] = damage
+        self.is_dead[slot] = False
+        self.last_move_time[slot] = now
+        self.respawn_delay[slot] = random.randint(1000, 3000)
+        self.last_respawn_time[slot] = now
+        self.frame[slot] = 0
+        self.last_frame_time[slot] = now
+
+    def spawn(self, x, y, hp, damage):
+        """Dodaje przeciwnika do roju i zwraca jego widok (None, jeśli rój osiągnął max_capacity)."""
+        self._load_frames()
+        if not self._free:
+            capacity = len(self.x)
+            if self.max_capacity is not None and capacity >= self.max_capacity:
+                self.refused += 1
+                return None
+            self._grow(capacity * 2 if self.max_capacity is None else min(capacity * 2, self.max_capacity))
+        slot = self._free.pop()
+        if self._recycled:
+            self._recycled -= 1
+            self.reused += 1
+        else:
+            self.fresh += 1
+        self.reset_slot(slot, x, y, hp, damage)
+        self.active[slot] = True
+        self.order[slot] = self._spawned
+        self._spawned += 1
+        enemy = Enemy(self, slot)
+        self._views[slot] = enemy
+        self._order[enemy] = None
+        self._index = None
+        return enemy
+
+    def remove(self, enemy):
+        del self._order[enemy]
+        self.active[enemy.slot] = False  # Indeks pomija nieaktywne wiersze, więc go nie przeliczamy
+        self._views[enemy.slot] = None
+        self._free.append(enemy.slot)
+        self._recycled += 1
+
+    def snapshot(self):
+        """
+        Kopie zapisywanych kolumn zajętych wierszy (w kolejności dodania) razem
+        z numerami wierszy i wolnymi wierszami, więc odtworzony rój zachowuje
+        się dokładnie tak samo jak zapisany.
+        """
+        slots = np.flatnonzero(self.active)
+        slots = slots[np.argsort(self.order[slots], kind="stable")]
+        state = {name: getattr(self, name)[slots] for name, _ in self.SAVED_COLUMNS}
+        state["slot"] = slots
+        state["free"] = np.array(self._free, dtype=np.int64)
+        state["capacity"] = len(self.x)
+        state["spawned"] = self._spawned
+        return state
+
+    def restore(self, state, time_shift=0):
+        """Odtwarza pusty rój z migawki snapshot(); czasy przesuwa o time_shift (ms)."""
+        if len(self.x) < state["capacity"]:  # Zapisany rój mieści się niezależnie od max_capacity
+            self._grow(state["capacity"])
+        slots = state["slot"]
+        for name, _ in self.SAVED_COLUMNS:
+            values = state[name]
+            if name in self.TIME_COLUMNS:
+                values = values + time_shift
+            getattr(self, name)[slots] = values
+        self.active[slots] = True
+        self.prev_x[slots] = self.x[slots]
+        self.prev_y[slots] = self.y[slots]
+        self._free = state["free"].tolist()
+        self._spawned = state["spawned"]
+        self._load_frames()
+        for slot in slots.tolist():
+            enemy = Enemy(self, slot)
+            self._views[slot] = enemy
+            self._order[enemy] = None
+        self._index = None
+
+    def remember_positions(self):
+        """Zapamiętuje pozycje sprzed kroku logiki (do interpolacji rysowania)."""
+        np.copyto(self.prev_x, self.x)
+        np.copyto(self.prev_y, self.y)
+
+    def move_towards_player(self, player, flow_field=None):
+        """
+        Ruch całego roju: przeciwnicy, którym minął czas między ruchami, robią
+        krok z pola przepływu, a poza polem krok wprost do gracza.
+        """
+        now = game_clock.get_ticks()
+        slots = np.flatnonzero(self.active & ~self.is_dead & (now - self.last_move_time >= Enemy.move_delay))
+        if not len(slots):
+            return
+        x = self.x[slots].astype(np.int64)
+        y = self.y[slots].astype(np.int64)
+
+        to_player_x = player.x - x
+        to_player_y = player.y - y
+        horizontal = np.abs(to_player_x) > np.abs(to_player_y)
+        dx = np.where(horizontal, np.where(to_player_x > 0, 1, -1), 0)
+        dy = np.where(horizontal, 0, np.where(to_player_y > 0, 1, -1))
+        if flow_field is not None:
+            step_dx, step_dy, found = flow_field.steps(x, y)
+            dx = np.where(found, step_dx, dx)
+            dy = np.where(found, step_dy, dy)
+
+        new_x = x + dx
+        new_y = y + dy
+        self.x[slots] = new_x
+        self.y[slots] = new_y
+        self.last_move_time[slots] = now
+        self._index = None
+
+    def animate(self):
+        """Przesuwa klatkę animacji wszystkim przeciwnikom, którym minął jej czas."""
+        if self.walk_frames is None:
+            return
+        now = game_clock.get_ticks()
+        due = self.active & (now - self.last_frame_time >= Enemy.animation_speed)
+        self.last_frame_time[due] = now
+        self.frame[due] = (self.frame[due] + 1) % len(self.walk_frames)
+
+    def _kill(self, slots, player):
+        """Oznacza wiersze jako martwe i zwraca ich widoki."""
+        self.is_dead[slots] = True
+        self.last_respawn_time[slots] = game_clock.get_ticks()
+        killed = []
+        for slot in slots:
+            player.bats_defeated += 1  # Zwiększ licznik pokonanych nietoperzy
+            combat_log.info("Przeciwnik zginął! Liczba pokonanych nietoperzy: %d", player.bats_defeated)
+            killed.append(self._views[slot])
+        return killed
+
+    def damage_slots(self, slots, damage, player):
+        """
+        Zadaje obrażenia (jedna wartość albo tablica na wiersz) przeciwnikom
+        z podanych wierszy naraz (np. strefy AreaEffects) i zwraca tych, którzy przy tym zginęli.
+        """
+        alive = ~self.is_dead[slots]  # Martwi nie otrzymują obrażeń
+        slots = slots[alive]
+        damage = np.broadcast_to(damage, alive.shape)[alive]
+        self.hp[slots] -= damage
+        if combat_log.isEnabledFor(logging.DEBUG):
+            for slot, amount in zip(slots, damage):
+                combat_log.debug("Przeciwnik otrzymał %d obrażeń. Pozostało HP: %d", amount, self.hp[slot])
+        return self._kill(slots[self.hp[slots] <= 0], player)
+
+    def detect_deaths(self, player):
+        """Oznacza jako martwych żywych przeciwników z HP <= 0; zwraca ich widoki."""
+        return self._kill(np.flatnonzero(self.active & ~self.is_dead & (self.hp <= 0)), player)
+
+    def draw(self, surface, camera, alpha=1.0):
+        """
+        Rysuje przeciwników widocznych przez kamerę jednym wywołaniem Surface.blits,
+        w kolejności dodania, w położeniu między poprzednim a bieżącym krokiem
+        logiki (alpha 0..1). Zwraca listę zmienionych prostokątów.
+        """
+        if self.walk_frames is None:
+            return []
+        width, height = Enemy.target_size
+        if alpha >= 1:
+            screen_x = self.x.astype(np.int64) * TILE_SIZE - camera.x_offset
+            screen_y = self.y.astype(np.int64) * TILE_SIZE - camera.y_offset
+        else:
+            x = self.prev_x + (self.x - self.prev_x) * alpha
+            y = self.prev_y + (self.y - self.prev_y) * alpha
+            screen_x = np.rint(x * TILE_SIZE).astype(np.int64) - camera.x_offset
+            screen_y = np.rint(y * TILE_SIZE).astype(np.int64) - camera.y_offset
+        visible = (self.active & (screen_x > -width) & (screen_x < camera.width) &
+                   (screen_y > -height) & (screen_y < camera.height))
+        slots = np.flatnonzero(visible)
+        slots = slots[np.argsort(self.order[slots], kind="stable")]
+        frames = self.walk_frames
+        return surface.blits([
+            (frames[frame], (sx, sy))
+            for frame, sx, sy in zip(self.frame[slots].tolist(), screen_x[slots].tolist(), screen_y[slots].tolist())
+        ])
+
+    def positions(self):
+        """Zwraca tablice pozycji (x, y) żywych przeciwników."""
+        alive = self.active & ~self.is_dead
+        return self.x[alive], self.y[alive]
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, index):
+        return list(self._order)[index]
+
+    def stats(self):
+        """Liczniki wierszy roju (ponowne użycie zwolnionych wierszy, nowe wiersze, odrzucone dodania)."""
+        return {
+            "capacity": len(self.x),
+            "max_capacity": self.max_capacity,
+            "active": len(self._order),
+            "free": len(self._free),
+            "reused": self.reused,
+            "fresh": self.fresh,
+            "refused": self.refused,
+            "grows": self.grows,
+        }
+
+    def tile_index(self):
+        """
+        Wiersze żywych przeciwników posortowane po kluczu kafelka y * ROW + x
+        i same klucze. Liczone raz po zmianie pozycji (ruch, dodanie) i wspólne
+        dla wszystkich zapytań kroku; usunięci i martwi są odsiewani przy zapytaniu.
+        """
+        if self._index is None:
+            slots = np.flatnonzero(self.active & ~self.is_dead)
+            keys = self.y[slots].astype(np.int64) * self.ROW + self.x[slots]
+            by_key = np.argsort(keys, kind="stable")
+            self._index = (slots[by_key], keys[by_key])
+        return self._index
+
+    def query_windows(self, first_x, first_y, last_x, last_y):
+        """
+        Żywi przeciwnicy w oknach kafelków (first_x..last_x, first_y..last_y),
+        dla wszystkich okien naraz: każdy rząd okna to jeden przedział
+        searchsorted w tile_index(). Zwraca tablice par (numer okna, wiersz).
+        """
+        slots, keys = self.tile_index()
+        first_x = np.maximum(first_x, 0)
+        last_x = np.minimum(last_x, self.ROW - 1)
+        rows = np.where(first_x <= last_x, np.maximum(last_y - first_y + 1, 0), 0)
+        window = np.repeat(np.arange(len(rows)), rows)
+        line = first_y[window] + np.arange(len(window)) - np.repeat(np.cumsum(rows) - rows, rows)
+        first = np.searchsorted(keys, line * self.ROW + first_x[window], "left")
+        counts = np.searchsorted(keys, line * self.ROW + last_x[window], "right") - first
+        window = np.repeat(window, counts)
+        found = slots[np.arange(len(window)) - np.repeat(np.cumsum(counts) - counts - first, counts)]
+        alive = self.active[found] & ~self.is_dead[found]  # Usunięci i zabici od przeliczenia indeksu
+        return window[alive], found[alive]
+
+    def first_in_windows(self, first_x, first_y, last_x, last_y):
+        """Dla każdego okna kafelków wiersz najwcześniej dodanego żywego przeciwnika albo -1."""
+        target = np.full(len(first_x), -1, dtype=np.int64)
+        window, found = self.query_windows(first_x, first_y, last_x, last_y)
+        best = np.lexsort((self.order[found], window))
+        windows, first = np.unique(window[best], return_index=True)
+        target[windows] = found[best[first]]
+        return target
+
+    def query_point(self, x, y):
+        """Żywi przeciwnicy stojący na kafelku (x, y), w kolejności dodania."""
+        tile = np.array([x]), np.array([y])
+        _, found = self.query_windows(*tile, *tile)
+        return [self._views[slot] for slot in found[np.argsort(self.order[found])].tolist()]
 
 
 class Item:
     def __init__(self, x, y, item_type):
+        self.reset(x, y, item_type)
+
+    def reset(self, x, y, item_type):
+        """Ustawia pozycję i typ przedmiotu (także przy ponownym użyciu z puli)."""
         self.x = x  # Pozycja na mapie (w kratkach)
         self.y = y
         self.item_type = item_type  # Typ przedmiotu, np. "weapon1", "shield1"
-        # Ładowanie obrazu na podstawie typu
-        self.image = pygame.image.load(f"{item_type}.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (TILE_SIZE, TILE_SIZE))
+        # Obraz na podstawie typu
+        self.image = assets.get(f"{item_type}.png", (TILE_SIZE, TILE_SIZE))
 
     def draw(self, surface, camera):
         """Rysowanie przedmiotu na mapie."""
         screen_x, screen_y = camera.apply(self.x, self.y)
-        surface.blit(self.image, (screen_x, screen_y))
+        return surface.blit(self.image, (screen_x, screen_y))
+
+
+# Pule obiektów
+class ObjectPool:
+    """
+    Pula obiektów do ponownego użycia zamiast tworzenia i porzucania.
+    Klasa obiektów musi mieć metodę reset() z tymi samymi argumentami co __init__.
+    Wolnych obiektów trzymamy najwyżej max_free; nadmiarowe trafiają do GC.
+    """
+    def __init__(self, factory, max_free=256):
+        self.factory = factory
+        self.max_free = max_free
+        self._free = []
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+        self.discarded = 0
+
+    def acquire(self, *args):
+        """Zwraca obiekt z puli (zresetowany) lub nowy, jeśli pula jest pusta."""
+        if self._free:
+            obj = self._free.pop()
+            obj.reset(*args)
+            self.reused += 1
+            return obj
+        self.created += 1
+        return self.factory(*args)
+
+    def release(self, obj):
+        """Oddaje obiekt do puli; obiektu nie wolno potem używać."""
+        self.released += 1
+        if len(self._free) < self.max_free:
+            self._free.append(obj)
+        else:
+            self.discarded += 1
+
+    def stats(self):
+        """Zwraca liczniki puli."""
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "released": self.released,
+            "discarded": self.discarded,
+            "free": len(self._free),
+        }
+
 
+item_pool = ObjectPool(Item, max_free=128)
 
-class Projectile:
-    def __init__(self, x, y, dx, dy, speed):
-        self.x = x  # Współrzędna X w pikselach
-        self.y = y  # Współrzędna Y w pikselach
-        self.dx = dx  # Kierunek ruchu w osi X (-1, 0, 1)
-        self.dy = dy  # Kierunek ruchu w osi Y (-1, 0, 1)
-        self.speed = speed  # Prędkość pocisku w pikselach na klatkę
-        self.color = (255, 255, 0)  # Żółty kolor dla pocisku
+
+class ProjectileSystem:
+    """
+    Wszystkie pociski trzymane jako kolumny tablic NumPy (struct-of-arrays).
+    Ruch, usuwanie pocisków spoza mapy i wyszukiwanie trafień odbywa się
+    hurtowo dla wszystkich pocisków naraz.
+    """
+    def __init__(self, capacity=64, max_capacity=None):
+        self.max_capacity = max_capacity  # Najwięcej pocisków naraz (None - bez limitu); nadmiarowe przepadają
+        if max_capacity is not None:
+            capacity = min(capacity, max_capacity)
+        self.x = np.zeros(capacity)  # Współrzędne X w pikselach
+        self.y = np.zeros(capacity)  # Współrzędne Y w pikselach
+        self.dx = np.zeros(capacity)  # Kierunek ruchu w osi X (-1, 0, 1)
+        self.dy = np.zeros(capacity)  # Kierunek ruchu w osi Y (-1, 0, 1)
+        self.speed = np.zeros(capacity)  # Prędkość pocisku w pikselach na krok logiki (TICK_MS)
+        self.count = 0  # Liczba aktywnych pocisków (zajmują początek tablic)
+        self.color = (255, 255, 0)  # Żółty kolor dla pocisków
         self.size = 5  # Rozmiar pocisku (promień)
+        self._sprite = None  # Gotowe kółko pocisku (do rysowania przez Surface.blits)
+        self.spawned = 0
+        self.dropped = 0  # Pociski odrzucone przy pełnych tablicach (max_capacity)
+        self.grows = 0
+
+    def __len__(self):
+        return self.count
+
+    def _columns(self):
+        return (self.x, self.y, self.dx, self.dy, self.speed)
+
+    def snapshot(self):
+        """Kopie kolumn aktywnych pocisków (x, y, dx, dy, speed)."""
+        return tuple(column[:self.count].copy() for column in self._columns())
+
+    def restore(self, columns):
+        """Dodaje pociski zapisane przez snapshot()."""
+        for values in zip(*columns):
+            self.spawn(*(float(value) for value in values))
+
+    def _grow(self):
+        """Podwaja pojemność tablic (najwyżej do max_capacity)."""
+        capacity = len(self.x) * 2
+        if self.max_capacity is not None:
+            capacity = min(capacity, self.max_capacity)
+        for name in ("x", "y", "dx", "dy", "speed"):
+            column = np.zeros(capacity)
+            column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+        self.grows += 1
+
+    def spawn(self, x, y, dx, dy, speed):
+        """Dodaje nowy pocisk; przy pełnych tablicach (max_capacity) pocisk przepada."""
+        if self.count == len(self.x):
+            if self.max_capacity is not None and self.count >= self.max_capacity:
+                self.dropped += 1
+                return
+            self._grow()
+        self.spawned += 1
+        i = self.count
+        self.x[i], self.y[i], self.dx[i], self.dy[i], self.speed[i] = x, y, dx, dy, speed
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def stats(self):
+        """Liczniki pocisków i pojemności tablic."""
+        return {
+            "capacity": len(self.x),
+            "max_capacity": self.max_capacity,
+            "active": self.count,
+            "spawned": self.spawned,
+            "dropped": self.dropped,
+            "grows": self.grows,
+        }
 
-    def move(self):
-        """Aktualizacja pozycji pocisku."""
-        self.x += self.dx * self.speed
-        self.y += self.dy * self.speed
+    def _keep(self, alive):
+        """Zostawia tylko pociski oznaczone w masce, zachowując ich kolejność."""
+        kept = int(np.count_nonzero(alive))
+        if kept != self.count:
+            for column in self._columns():
+                column[:kept] = column[:self.count][alive]
+            self.count = kept
+
+    def update(self, map_width, map_height, blocks, enemies, player, items, effects):
+        """
+        Przesuwa pociski i rozstrzyga kolizje z blokami, granicami mapy i przeciwnikami.
+        Trafione bloki wybuchają strefą w effects (AreaEffects).
+        """
+        n = self.count
+        if n == 0:
+            return
+        x, y = self.x[:n], self.y[:n]
+        x += self.dx[:n] * self.speed[:n]
+        y += self.dy[:n] * self.speed[:n]
+
+        # Pociski poza granicami mapy
+        alive = (x >= 0) & (x <= map_width * TILE_SIZE) & (y >= 0) & (y <= map_height * TILE_SIZE)
+
+        # Trafienia w aktywne bloki wybuchowe (porównanie kafelków wszystkich pocisków naraz)
+        tile_x = (x // TILE_SIZE).astype(np.int64)
+        tile_y = (y // TILE_SIZE).astype(np.int64)
+        if len(blocks):
+            row = map_width + 1  # +1, bo pocisk może leżeć dokładnie na prawej krawędzi mapy
+            on_block = alive & np.isin(tile_y * row + tile_x, blocks.tile_keys(row))
+            for i in np.flatnonzero(on_block):
+                for block in blocks.at(int(tile_x[i]), int(tile_y[i])):
+                    if block.is_active:
+                        block.explode(effects, map_width, map_height)  # Wywołanie eksplozji
+                        alive[i] = False
+                        break
+
+        # Kolizje z przeciwnikami: okno kafelków, na których środek przeciwnika
+        # leży w tolerancji od pocisku, dopasowywane hurtowo dla wszystkich pocisków
+        tolerance = TILE_SIZE // 2  # Tolerancja na trafienie
+        center_offset = (TILE_SIZE * 3) // 2
+        shots = np.flatnonzero(alive)
+        x, y = x[shots], y[shots]
+        target = enemies.first_in_windows(
+            np.ceil((x - center_offset - tolerance) / TILE_SIZE).astype(np.int64),
+            np.ceil((y - center_offset - tolerance) / TILE_SIZE).astype(np.int64),
+            np.floor((x - center_offset + tolerance) / TILE_SIZE).astype(np.int64),
+            np.floor((y - center_offset + tolerance) / TILE_SIZE).astype(np.int64),
+        )
+        hit = target >= 0
+        alive[shots[hit]] = False
+        struck, hits = np.unique(target[hit], return_counts=True)  # Pociski w tego samego przeciwnika sumują się
+        for enemy in enemies.damage_slots(struck, hits * player.damage, player):
+            player.gain_exp(20)
+            enemy.drop_item(items)  # Zrzucanie przedmiotu
+            if loot_log.isEnabledFor(logging.DEBUG):  # Nie buduj listy, gdy logowanie jest wyłączone
+                loot_log.debug("Aktualna lista przedmiotów: %s", [item.item_type for item in items])
+            enemies.remove(enemy)  # Usuwamy przeciwnika z listy
+            player.quest_progress += 1  # Zwiększ postęp zadania
+            player.check_quest_completion()
+
+        self._keep(alive)
+
+    def draw(self, surface, camera, alpha=1.0):
+        """
+        Rysowanie pocisków widocznych przez kamerę, cofniętych o (1 - alpha) ostatniego
+        kroku logiki (ruch jest jednostajny). Zwraca listę zmienionych prostokątów.
+        """
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        if alpha < 1:
+            lag = self.speed[:n] * (1 - alpha)
+            x = x - self.dx[:n] * lag
+            y = y - self.dy[:n] * lag
+        screen_x = (x - camera.x_offset).astype(np.int64)
+        screen_y = (y - camera.y_offset).astype(np.int64)
+        visible = ((screen_x >= -self.size) & (screen_x < camera.width + self.size) &
+                   (screen_y >= -self.size) & (screen_y < camera.height + self.size))
+        if self._sprite is None:
+            diameter = self.size * 2 + 1
+            self._sprite = pygame.Surface((diameter, diameter), pygame.SRCALPHA)
+            pygame.draw.circle(self._sprite, self.color, (self.size, self.size), self.size)
+        sprite = self._sprite
+        return surface.blits([(sprite, (sx, sy))
+                              for sx, sy in zip((screen_x[visible] - self.size).tolist(),
+                                                (screen_y[visible] - self.size).tolist())])
+
+CHUNK_TILES = 16  # Rozmiar fragmentu tła w kafelkach
+GRASS_TEXTURE_SIZE = (MAP_WIDTH * TILE_SIZE, MAP_HEIGHT * TILE_SIZE)  # Na większych mapach tekstura się powtarza
+
+
+class BackgroundRenderer:
+    """
+    Rysuje tło mapy z wcześniej przygotowanych fragmentów (chunków).
+    W każdej klatce rysowane są tylko fragmenty widoczne przez kamerę,
+    a zbudowane fragmenty są trzymane w pamięci LRU.
+    """
+    def __init__(self, chunk_tiles=CHUNK_TILES, max_chunks=48):
+        self.chunk_size = chunk_tiles * TILE_SIZE  # Rozmiar fragmentu w pikselach
+        self.max_chunks = max_chunks
+        self._chunks = OrderedDict()  # (cx, cy) -> Surface
+        self._map_size = None  # Rozmiar mapy w pikselach, dla której zbudowano fragmenty
+        self.built = 0
+        self.evictions = 0
+
+    def _build_chunk(self, cx, cy):
+        """Składa fragment z powtarzanej tekstury trawy, przycięty do granic mapy."""
+        texture = assets.get("grass6.png", GRASS_TEXTURE_SIZE)
+        tex_w, tex_h = texture.get_size()
+        map_w, map_h = self._map_size
+        left = cx * self.chunk_size
+        top = cy * self.chunk_size
+        width = min(self.chunk_size, map_w - left)
+        height = min(self.chunk_size, map_h - top)
+
+        chunk = pygame.Surface((width, height)).convert()
+        chunk.fill(BLACK)
+        y = 0
+        while y < height:
+            src_y = (top + y) % tex_h
+            part_h = min(tex_h - src_y, height - y)
+            x = 0
+            while x < width:
+                src_x = (left + x) % tex_w
+                part_w = min(tex_w - src_x, width - x)
+                chunk.blit(texture, (x, y), (src_x, src_y, part_w, part_h))
+                x += part_w
+            y += part_h
+
+        self.built += 1
+        return chunk
+
+    def _get_chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = self._build_chunk(cx, cy)
+            self._chunks[key] = chunk
+            if len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)  # Usuń najdawniej używany fragment
+                self.evictions += 1
+        else:
+            self._chunks.move_to_end(key)
+        return chunk
+
+    def draw(self, surface, camera, map_width, map_height):
+        """Rysuje fragmenty tła przecinające się z widokiem kamery."""
+        map_size = (map_width * TILE_SIZE, map_height * TILE_SIZE)
+        if map_size != self._map_size:  # Nowa mapa - stare fragmenty są nieaktualne
+            self._chunks.clear()
+            self._map_size = map_size
+
+        size = self.chunk_size
+        first_cx = max(0, camera.x_offset // size)
+        first_cy = max(0, camera.y_offset // size)
+        last_cx = min((map_size[0] - 1) // size, (camera.x_offset + camera.width - 1) // size)
+        last_cy = min((map_size[1] - 1) // size, (camera.y_offset + camera.height - 1) // size)
+
+        surface.blits([
+            (self._get_chunk(cx, cy), (cx * size - camera.x_offset, cy * size - camera.y_offset))
+            for cy in range(first_cy, last_cy + 1)
+            for cx in range(first_cx, last_cx + 1)
+        ], doreturn=False)
+
+
+background_renderer = BackgroundRenderer()
 
-    def draw(self, surface, camera):
-        """Rysowanie pocisku."""
-        screen_x = int(self.x - camera.x_offset)
-        screen_y = int(self.y - camera.y_offset)
-        pygame.draw.circle(surface, self.color, (screen_x, screen_y), self.size)
 
 def draw_map(surface, game_map, camera):
-    # Załaduj obraz tła i przeskaluj go do rozmiarów całej mapy
-    grass_tile = pygame.image.load("grass6.png").convert_alpha()
-    grass_tile = pygame.transform.scale(grass_tile, (MAP_WIDTH * TILE_SIZE, MAP_HEIGHT * TILE_SIZE))
+    """Rysuje widoczną część tła mapy."""
+    background_renderer.draw(surface, camera, len(game_map[0]), len(game_map))
 
-    # Oblicz przesunięcie kamery i wyświetl odpowiedni fragment tła
-    screen_x = -camera.x_offset
-    screen_y = -camera.y_offset
-    surface.blit(grass_tile, (screen_x, screen_y))
 
+# Warstwy świata: tylko obiekty widoczne przez kamerę, jedno Surface.blits na warstwę
+def draw_items(surface, items, camera):
+    """Rysuje przedmioty z widocznych kafelków. Zwraca listę zmienionych prostokątów."""
+    return surface.blits([(item.image, camera.apply(item.x, item.y))
+                          for item in items.query_rect(*camera.visible_tiles())])
+
+
+def draw_blocks(surface, blocks, camera):
+    """Rysuje widoczne bloki wybuchowe i eksplozje. Zwraca listę zmienionych prostokątów."""
+    return surface.blits([sprite for block in blocks for sprite in block.sprites(camera)])
+
+
+
+class MinimapRenderer:
+    """
+    Minimapa z zapamiętaną warstwą terenu.
+    Teren jest rysowany raz (i odświeżany tylko po zmianie mapy), a znaczniki
+    gracza i przeciwników są nakładane w jednym przebiegu przez surfarray.
+    """
+    def __init__(self):
+        self._map = None  # Mapa, dla której zbudowano warstwę terenu
+        self._size = None
+        self._terrain = None  # Zapamiętana warstwa terenu
+        self._frame = None  # Powierzchnia robocza: teren + znaczniki
+        self.tile_width = 0
+        self.tile_height = 0
+        self.tile_step = 1  # Co który kafelek mapy trafia na minimapę
+        self.rebuilds = 0
+
+    def invalidate(self):
+        """Wymusza przebudowanie terenu (np. po zmianie kafelków mapy)."""
+        self._map = None
+
+    def _build_terrain(self, game_map, minimap_size):
+        minimap_width, minimap_height = minimap_size
+        map_width = len(game_map[0])
+        map_height = len(game_map)
+
+        # Mapa większa niż minimapa: co tile_step-ty kafelek w obu osiach
+        self.tile_step = max(1, -(-map_width // minimap_width), -(-map_height // minimap_height))
+        columns = -(-map_width // self.tile_step)
+        rows = -(-map_height // self.tile_step)
+
+        # Skalowanie kratki na minimapie
+        self.tile_width = max(1, minimap_width // columns)
+        self.tile_height = max(1, minimap_height // rows)
+
+        # Skały na szaro, trawa na czarno; każdy kafelek powiększony do rozmiaru kratki
+        ys, xs = np.mgrid[0:rows, 0:columns] * self.tile_step
+        tiles = game_map.sample(xs, ys)
+        palette = np.array([BLACK, GRAY], dtype=np.uint8)
+        pixels = palette[(tiles == 1).astype(np.uint8)]
+        pixels = pixels.repeat(self.tile_height, axis=0).repeat(self.tile_width, axis=1)
+        pixels = pixels[:minimap_height, :minimap_width]
+
+        self._terrain = pygame.surfarray.make_surface(pixels.transpose(1, 0, 2)).convert()
+        self._frame = self._terrain.copy()
+        self._map = game_map
+        self._size = minimap_size
+        self.rebuilds += 1
+
+    def _draw_markers(self, pixels, xs, ys, color):
+        """Zapisuje prostokąty znaczników dla wszystkich pozycji naraz."""
+        frame_width, frame_height = pixels.shape
+        xs, ys = xs // self.tile_step, ys // self.tile_step
+        px = xs[:, None, None] * self.tile_width + np.arange(self.tile_width)[None, :, None]
+        py = ys[:, None, None] * self.tile_height + np.arange(self.tile_height)[None, None, :]
+        px, py = np.broadcast_arrays(px, py)
+        visible = (px >= 0) & (px < frame_width) & (py >= 0) & (py < frame_height)
+        pixels[px[visible], py[visible]] = self._frame.map_rgb(color)
+
+    def draw(self, surface, game_map, player, enemies, minimap_size, x, y):
+        if self._map is not game_map or self._size != minimap_size:
+            self._build_terrain(game_map, minimap_size)
+
+        self._frame.blit(self._terrain, (0, 0))
+
+        enemy_xs, enemy_ys = enemies.positions()  # Tylko żywi
+        pixels = pygame.surfarray.pixels2d(self._frame)
+        self._draw_markers(pixels, np.array([player.x]), np.array([player.y]), GREEN)
+        if len(enemy_xs):
+            self._draw_markers(pixels, enemy_xs.astype(np.int64), enemy_ys.astype(np.int64), RED)
+        del pixels  # Odblokowanie powierzchni przed rysowaniem
+
+        rect = surface.blit(self._frame, (x, y))
+
+        # Obramowanie minimapy
+        pygame.draw.rect(surface, WHITE, (x, y, minimap_size[0], minimap_size[1]), 2)
+        return rect
+
+
+minimap_renderer = MinimapRenderer()
 
 
 def draw_minimap(surface, game_map, player, enemies, minimap_size, x, y):
     """Rysowanie minimapy w określonym miejscu na ekranie."""
     if not game_map or not game_map[0]:  # Jeśli mapa jest pusta, nie rysujemy
         return
+    return minimap_renderer.draw(surface, game_map, player, enemies, minimap_size, x, y)
+
+
+# Odświeżanie ekranu
+class ScreenUpdater:
+    """
+    Rysowanie tła i wysyłanie klatki na ekran.
+    W trybie prostokątów zmian (dirty_rects) tło mapy jest trzymane w osobnej
+    powierzchni: dopóki kamera stoi, łatane jest tylko tam, gdzie coś narysowano
+    w poprzedniej klatce, a display.update dostaje tylko te prostokąty.
+    Ruch kamery (albo invalidate) wymusza pełne odświeżenie.
+    """
+    def __init__(self, dirty_rects=False, max_rects=256):
+        self.dirty_rects = dirty_rects
+        self.max_rects = max_rects  # Powyżej tej liczby taniej jest odświeżyć cały ekran
+        self.full_redraw = True  # Czy bieżąca klatka jest rysowana w całości
+        self.full_redraws = 0
+        self.partial_redraws = 0
+        self._background = None  # Tło mapy dla zapamiętanej pozycji kamery
+        self._camera = None  # Pozycja kamery, dla której narysowano tło
+        self._previous = []  # Prostokąty narysowane w poprzedniej klatce
+        self._current = []
+
+    def invalidate(self):
+        """Wymusza pełne odświeżenie (np. po oknie, które zasłoniło grę)."""
+        self._camera = None
+
+    def begin(self, surface, game_map, camera):
+        """Rysuje tło klatki: całe albo tylko pod poprzednio narysowanymi obiektami."""
+        self._current = []
+        if not self.dirty_rects:
+            self.full_redraw = True
+            surface.fill(BLACK)  # Wyczyść ekran
+            draw_map(surface, game_map, camera)
+            return
+
+        position = (camera.x_offset, camera.y_offset)
+        self.full_redraw = position != self._camera or len(self._previous) > self.max_rects
+        if position != self._camera:
+            if self._background is None or self._background.get_size() != surface.get_size():
+                self._background = pygame.Surface(surface.get_size()).convert()
+            self._background.fill(BLACK)
+            draw_map(self._background, game_map, camera)
+            self._camera = position
+        if self.full_redraw:
+            surface.blit(self._background, (0, 0))
+        else:
+            for rect in self._previous:
+                surface.blit(self._background, rect, rect)
+
+    def add(self, rects):
+        """Zapamiętuje prostokąt (lub listę prostokątów) zwrócony przez rysowanie."""
+        if not self.dirty_rects or not rects:
+            return
+        if isinstance(rects, pygame.Rect):
+            self._current.append(rects)
+        else:
+            self._current.extend(rect for rect in rects if rect)
+
+    def present(self):
+        """Wysyła klatkę na ekran: całą albo tylko zmienione prostokąty."""
+        if self.full_redraw or len(self._current) > self.max_rects:
+            pygame.display.flip()
+            self.full_redraws += 1
+        else:
+            pygame.display.update(self._previous + self._current)
+            self.partial_redraws += 1
+        self._previous = self._current
+        startup.mark("first_frame")
 
-    minimap_width, minimap_height = minimap_size
-    map_width = len(game_map[0])
-    map_height = len(game_map)
 
-    # Skalowanie kratki na minimapie
-    tile_width = minimap_width // map_width
-    tile_height = minimap_height // map_height
+screen_updater = ScreenUpdater()
 
-    # Rysowanie mapy
-    for row_y, row in enumerate(game_map):
-        for col_x, tile in enumerate(row):
-            color = GRAY if tile == 1 else BLACK
-            pygame.draw.rect(surface, color,
-                             (x + col_x * tile_width, y + row_y * tile_height, tile_width, tile_height))
 
-    # Rysowanie gracza na minimapie
-    pygame.draw.rect(surface, GREEN,
-                     (x + player.x * tile_width, y + player.y * tile_height, tile_width, tile_height))
 
-    # Rysowanie przeciwników na minimapie
-    for enemy in enemies:
-        if not enemy.is_dead:  # Tylko żywi przeciwnicy
-            pygame.draw.rect(surface, RED,
-                             (x + enemy.x * tile_width, y + enemy.y * tile_height, tile_width, tile_height))
+# Sceny: menu i okna dialogowe
+class Scene:
+    """
+    Ekran prowadzony przez stos scen (SceneStack).
+    Scena modalna zatrzymuje wszystko pod sobą i jest rysowana tylko po zmianie
+    (albo co redraw_ms), a w międzyczasie gra czeka na zdarzenia.
+    """
+    modal = True
+    redraw_ms = 1000  # Odświeżanie sceny, w której nic się nie zmienia
 
-    # Obramowanie minimapy
-    pygame.draw.rect(surface, WHITE, (x, y, minimap_width, minimap_height), 2)
+    def __init__(self):
+        self.dirty = True  # Czy scena wymaga ponownego narysowania
 
+    def handle_event(self, event):
+        pass
 
+    def draw(self, surface):
+        pass
 
-def show_death_screen():
-    """Wyświetla ekran śmierci z opcjami resetu lub wyjścia."""
-    font = pygame.font.Font(None, 72)
-    small_font = pygame.font.Font(None, 36)
 
-    while True:
-        screen.fill(BLACK)
+class MenuScene(Scene):
+    """
+    Ekran tekstowy: wiersze (tekst, rozmiar, kolor, przesunięcie od środka ekranu)
+    i klawisze wywołujące akcje. Naciśnięcie klawisza zamyka scenę i wywołuje akcję.
+    """
+    def __init__(self, lines, actions):
+        super().__init__()
+        self.lines = lines
+        self.actions = actions  # Klawisz -> funkcja bez argumentów
 
-        # Teksty na ekranie śmierci
-        title_text = font.render("You Died", True, RED)
-        reset_text = small_font.render("Press R to Restart", True, WHITE)
-        quit_text = small_font.render("Press Q to Quit", True, WHITE)
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key in self.actions:
+            scenes.pop()
+            self.actions[event.key]()
 
-        # Wyświetlanie tekstów
-        screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 100))
-        screen.blit(reset_text, (WIDTH // 2 - reset_text.get_width() // 2, HEIGHT // 2))
-        screen.blit(quit_text, (WIDTH // 2 - quit_text.get_width() // 2, HEIGHT // 2 + 50))
+    def draw(self, surface):
+        surface.fill(BLACK)
+        for text, size, color, offset in self.lines:
+            rendered = text_cache.render(text, size, color)
+            surface.blit(rendered, (WIDTH // 2 - rendered.get_width() // 2, HEIGHT // 2 + offset))
 
-        pygame.display.flip()
 
-        for event in pygame.event.get():
+class SceneStack:
+    """
+    Stos scen prowadzony przez pętlę w main(): rozgrywka na dole, menu i okna
+    dialogowe nad nią. Scena modalna jest rysowana najwyżej max_fps razy na
+    sekundę i tylko po zmianie; pomiędzy proces śpi w pygame.event.wait.
+    """
+    def __init__(self, max_fps=30):
+        self.max_fps = max_fps
+        self._scenes = []
+        self._drawn_at = 0  # Czas ostatniego rysowania sceny modalnej (ms)
+
+    @property
+    def top(self):
+        return self._scenes[-1] if self._scenes else None
+
+    def __len__(self):
+        return len(self._scenes)
+
+    def push(self, scene):
+        scene.dirty = True
+        self._scenes.append(scene)
+
+    def pop(self):
+        scene = self._scenes.pop()
+        if self._scenes:
+            self._scenes[-1].dirty = True
+        screen_updater.invalidate()  # Zamknięta scena zasłaniała grę
+        return scene
+
+    def replace(self, scene):
+        """Zastępuje cały stos jedną sceną (np. nową rozgrywką po restarcie)."""
+        self._scenes.clear()
+        self.push(scene)
+
+    def clear(self):
+        """Zamyka wszystkie sceny (wyjście z gry)."""
+        self._scenes.clear()
+
+    def run_modal(self, surface):
+        """Jeden krok sceny modalnej ze szczytu stosu: rysowanie, jeśli trzeba, i czekanie na zdarzenia."""
+        scene = self.top
+        now = pygame.time.get_ticks()
+        if scene.dirty or now - self._drawn_at >= scene.redraw_ms:
+            scene.draw(surface)
+            pygame.display.flip()
+            startup.mark("first_frame")
+            scene.dirty = False
+            self._drawn_at = now
+
+        # Śpij do zdarzenia, najdłużej do kolejnego odświeżenia
+        timeout = max(1, scene.redraw_ms - (pygame.time.get_ticks() - self._drawn_at))
+        event = pygame.event.wait(timeout)
+        if event.type == pygame.NOEVENT:
+            return
+        for event in [event] + pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:  # Restart gry
-                    return True  # Zwraca True, aby zresetować grę
-                elif event.key == pygame.K_q:  # Wyjście z gry
-                    pygame.quit()
-                    exit()
-
-def generate_map_vampire_style(width, height):
+                self.clear()
+                return
+            scene.handle_event(event)
+            if self.top is not scene:
+                return
+
+        if scene.dirty:  # Seria zdarzeń nie przyspiesza rysowania ponad max_fps
+            remaining = 1000 // self.max_fps - (pygame.time.get_ticks() - self._drawn_at)
+            if remaining > 0:
+                pygame.time.wait(remaining)
+
+
+scenes = SceneStack()
+
+
+def main_menu_scene(start, load=None):
+    """Menu główne: S wywołuje start(), Q zamyka, L (jeśli podano load) wczytuje zapis."""
+    scene = MenuScene([
+        ("Roguelike Game", 72, WHITE, -100),
+        ("Press S to Start", 36, WHITE, 0),
+        ("Press Q to Quit", 36, WHITE, 50),
+    ], {pygame.K_s: start, pygame.K_q: scenes.clear})
+    if load is not None:
+        scene.lines.append(("Press L to Load Game", 36, WHITE, 100))
+        scene.actions[pygame.K_l] = load
+    return scene
+
+
+def pause_menu_scene():
+    """Menu pauzy (ESC): R wraca do gry, Q zamyka."""
+    return MenuScene([
+        ("Paused", 72, WHITE, -100),
+        ("Press R to Resume", 36, WHITE, 0),
+        ("Press Q to Quit", 36, WHITE, 50),
+    ], {pygame.K_r: lambda: None, pygame.K_q: scenes.clear})
+
+
+def death_scene(restart, load=None):
+    """Ekran śmierci: R wywołuje restart(), Q zamyka, L (jeśli podano load) wczytuje zapis."""
+    scene = MenuScene([
+        ("You Died", 72, RED, -100),
+        ("Press R to Restart", 36, WHITE, 0),
+        ("Press Q to Quit", 36, WHITE, 50),
+    ], {pygame.K_r: restart, pygame.K_q: scenes.clear})
+    if load is not None:
+        scene.lines.append(("Press L to Load Last Save", 36, WHITE, 100))
+        scene.actions[pygame.K_l] = load
+    return scene
+
+
+def level_up_scene(player, done):
+    """Okno wyboru nagrody za poziom; wybrany numer opcji trafia do done()."""
+    lines = [
+        ("Level Up! Choose an upgrade:", 36, WHITE, -100),
+        ("1: Increase Damage (+5)", 36, WHITE, -50),
+        ("2: Increase Max HP (+5)", 36, WHITE, 0),
+    ]
+    actions = {pygame.K_1: lambda: done(1), pygame.K_2: lambda: done(2)}
+    if player.holy_water_level < player.holy_water_max_level:
+        lines.append(("3: Upgrade Holy Water (+" + str(5 + player.holy_water_level) + " Damage, +10% AOE)",
+                      36, WHITE, 50))
+        actions[pygame.K_3] = lambda: done(3)
+    return MenuScene(lines, actions)
+
+
+def weapon_selection_scene(player, done):
+    """Okno wyboru broni; indeks wybranej broni (albo None) trafia do done()."""
+    weapons = player.inventory["weapons"]
+    lines = [("Choose your weapon:", 36, WHITE, -100)]
+    actions = {pygame.K_0: lambda: done(None)}
+    for i, weapon in enumerate(weapons[:9]):
+        lines.append((f"{i + 1}: {weapon}", 36, WHITE, -50 + i * 30))
+        actions[pygame.K_1 + i] = lambda i=i: done(i)
+    lines.append(("0: Exit selection", 36, WHITE, 50 + len(weapons) * 30))
+    return MenuScene(lines, actions)
+
+
+MAP_CHUNK_TILES = 64  # Bok fragmentu mapy kafelków (w kafelkach)
+
+
+def vampire_style_tiles(xs, ys, width, height):
     """
-    Generuje mapę w stylu Vampire Survivors:
+    Kafelki mapy w stylu Vampire Survivors dla tablic współrzędnych:
     - Krawędzie mapy (skały) jako '1'.
     - Wnętrze mapy (trawa) jako '0'.
     """
-    game_map = []
+    edge = (xs == 0) | (xs == width - 1) | (ys == 0) | (ys == height - 1)
+    return edge.astype(np.uint8)
 
-    for y in range(height):
-        row = []
-        for x in range(width):
-            if x == 0 or x == width - 1 or y == 0 or y == height - 1:
-                row.append(1)  # Skały na krawędziach
-            else:
-                row.append(0)  # Trawa w środku
-        game_map.append(row)
 
-    return game_map
+class MapRow:
+    """Wiersz mapy: game_map[y][x] oraz wycinki game_map[y][a:b] (jako bytes)."""
+    __slots__ = ("map", "y")
+
+    def __init__(self, game_map, y):
+        self.map = game_map
+        self.y = y
+
+    def __len__(self):
+        return self.map.width
+
+    def __getitem__(self, x):
+        width = self.map.width
+        if isinstance(x, slice):
+            start, stop, step = x.indices(width)
+            if step == 1:
+                return self.map.row_bytes(self.y, start, stop)
+            return bytes(self.map.get(i, self.y) for i in range(start, stop, step))
+        if x < 0:
+            x += width
+        if not 0 <= x < width:
+            raise IndexError("poza mapą")
+        return self.map.get(x, self.y)
 
+    def __setitem__(self, x, tile):
+        self.map.set(x, self.y, tile)
 
-def draw_background(surface):
+    def __iter__(self):
+        return iter(self.map.row_bytes(self.y, 0, self.map.width))
+
+
+class ChunkedMap:
     """
-    Rysuje tło mapy na ekranie.
+    Mapa kafelków podzielona na kwadratowe fragmenty (po bajcie na kafelek).
+    Fragment jest generowany dopiero przy pierwszym odczycie, a fragmenty
+    daleko od gracza (focus) albo ponad limit max_resident są usuwane z pamięci:
+    zmienione trafiają do pliku stron mapowanego w pamięci (mmap), niezmienione
+    są po prostu generowane od nowa. Zużycie RAM nie zależy więc od rozmiaru świata.
+    Dostęp jak do listy list: game_map[y][x], len(game_map), len(game_map[0]).
     """
-    background = pygame.image.load("grass6.png")  # Ścieżka do pliku
-    background = pygame.transform.scale(background, (WIDTH, HEIGHT))  # Dopasowanie do rozmiaru ekranu
-    surface.blit(background, (0, 0))
+    def __init__(self, width, height, tiles=vampire_style_tiles, chunk_tiles=MAP_CHUNK_TILES,
+                 max_resident=64, keep_radius=2):
+        self.width = width
+        self.height = height
+        self.tiles = tiles  # Generator: (xs, ys, width, height) -> tablica kafelków uint8
+        self.chunk_tiles = chunk_tiles
+        self.chunk_bytes = chunk_tiles * chunk_tiles
+        self.chunks_x = -(-width // chunk_tiles)
+        self.chunks_y = -(-height // chunk_tiles)
+        self.max_resident = max_resident  # Limit fragmentów w pamięci
+        self.keep_radius = keep_radius  # Promień (we fragmentach) trzymany wokół gracza
+        self._chunks = OrderedDict()  # (cx, cy) -> bytearray, od najdawniej używanego
+        self._modified = set()  # Fragmenty różniące się od generatora
+        self._paged = set()  # Zmienione fragmenty zapisane w pliku stron
+        self._page_file = None
+        self._pages = None  # mmap pliku stron, tworzony przy pierwszym zapisie
+        self._focus = None
+        self.generated = 0
+        self.paged_out = 0
+        self.paged_in = 0
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if not 0 <= y < self.height:
+            raise IndexError("poza mapą")
+        return MapRow(self, y)
+
+    def __iter__(self):
+        return (MapRow(self, y) for y in range(self.height))
+
+    @property
+    def resident(self):
+        """Liczba fragmentów w pamięci."""
+        return len(self._chunks)
+
+    def get(self, x, y):
+        n = self.chunk_tiles
+        return self._chunk(x // n, y // n)[(y % n) * n + x % n]
+
+    def set(self, x, y, tile):
+        n = self.chunk_tiles
+        key = (x // n, y // n)
+        self._chunk(*key)[(y % n) * n + x % n] = tile
+        self._modified.add(key)
+
+    def row_bytes(self, y, start, stop):
+        """Kafelki wiersza y od start do stop (bez stop) złożone z kolejnych fragmentów."""
+        n = self.chunk_tiles
+        cy, row = divmod(y, n)
+        parts = []
+        x = start
+        while x < stop:
+            cx, col = divmod(x, n)
+            end = min(stop, (cx + 1) * n)
+            offset = row * n + col
+            parts.append(self._chunk(cx, cy)[offset:offset + end - x])
+            x = end
+        return b"".join(parts)
+
+    def sample(self, xs, ys):
+        """
+        Kafelki dla tablic współrzędnych bez wczytywania fragmentów: wartości
+        z generatora, poprawione tylko tam, gdzie fragment został zmieniony.
+        """
+        tiles = self.tiles(xs, ys, self.width, self.height).astype(np.uint8)
+        n = self.chunk_tiles
+        for cx, cy in self._modified:
+            inside = (xs // n == cx) & (ys // n == cy)
+            if inside.any():
+                chunk = np.frombuffer(bytes(self._peek((cx, cy))), dtype=np.uint8).reshape(n, n)
+                tiles[inside] = chunk[ys[inside] % n, xs[inside] % n]
+        return tiles
+
+    def focus(self, x, y):
+        """Usuwa z pamięci fragmenty dalej niż keep_radius od fragmentu z kafelkiem (x, y)."""
+        n = self.chunk_tiles
+        fx, fy = x // n, y // n
+        if self._focus == (fx, fy):
+            return
+        self._focus = (fx, fy)
+        far = [key for key in self._chunks
+               if max(abs(key[0] - fx), abs(key[1] - fy)) > self.keep_radius]
+        for key in far:
+            self._evict(key)
+
+    def _chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+        chunk = self._page_in(key) if key in self._paged else self._generate(cx, cy)
+        self._chunks[key] = chunk
+        if len(self._chunks) > self.max_resident:
+            self._evict(next(iter(self._chunks)))  # Najdawniej używany
+        return chunk
+
+    def _peek(self, key):
+        """Zawartość fragmentu bez zmiany stanu pamięci (do odczytów hurtowych)."""
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            return chunk
+        offset = self._page_offset(key)
+        return self._pages[offset:offset + self.chunk_bytes]
+
+    def _generate(self, cx, cy):
+        n = self.chunk_tiles
+        ys, xs = np.mgrid[cy * n:(cy + 1) * n, cx * n:(cx + 1) * n]
+        self.generated += 1
+        return bytearray(self.tiles(xs, ys, self.width, self.height).astype(np.uint8).tobytes())
+
+    def _page_offset(self, key):
+        cx, cy = key
+        return (cy * self.chunks_x + cx) * self.chunk_bytes
+
+    def _page_in(self, key):
+        offset = self._page_offset(key)
+        self.paged_in += 1
+        return bytearray(self._pages[offset:offset + self.chunk_bytes])
+
+    def _evict(self, key):
+        chunk = self._chunks.pop(key)
+        if key not in self._modified:
+            return  # Generator odtworzy go bez zmian
+        if self._pages is None:
+            # Plik rzadki: na dysku zajmują miejsce tylko zapisane fragmenty
+            self._page_file = tempfile.TemporaryFile(prefix="roguelike-map-")
+            self._page_file.truncate(self.chunks_x * self.chunks_y * self.chunk_bytes)
+            self._pages = mmap.mmap(self._page_file.fileno(), 0)
+        offset = self._page_offset(key)
+        self._pages[offset:offset + self.chunk_bytes] = chunk
+        self._paged.add(key)
+        self.paged_out += 1
 
 
-def show_weapon_selection(self):
-    """Wyświetla interfejs wyboru broni."""
-    font = pygame.font.Font(None, 36)
-    running = True
-    while running:
-        screen.fill(BLACK)
+def generate_map_vampire_style(width, height):
+    """
+    Generuje mapę w stylu Vampire Survivors (patrz vampire_style_tiles).
+    Kafelki powstają leniwie, fragmentami, więc mapa może być bardzo duża.
+    """
+    return ChunkedMap(width, height, vampire_style_tiles)
 
-        # Nagłówek
-        header_text = font.render("Choose your weapon:", True, WHITE)
-        screen.blit(header_text, (WIDTH // 2 - header_text.get_width() // 2, HEIGHT // 2 - 100))
 
-        # Wyświetlanie broni
-        for i, weapon in enumerate(self.inventory["weapons"]):
-            weapon_text = font.render(f"{i + 1}: {weapon}", True, WHITE)
-            screen.blit(weapon_text, (WIDTH // 2 - weapon_text.get_width() // 2, HEIGHT // 2 - 50 + i * 30))
+# Profiler klatek
+class FrameProfiler:
+    """
+    Mierzy czas kolejnych faz pętli gry w każdej klatce.
+    Ostatnie próbki są trzymane w buforze kołowym; nakładka pokazuje histogram
+    czasów klatek i percentyle p50/p95/p99, a próbki można zapisać do CSV.
+    """
+    PHASES = ("events", "input", "enemy_ai", "projectiles", "holy_water_blocks", "world_draw", "hud", "flip")
+    BUDGET_MS = 1000 / 60  # Budżet czasu na klatkę przy 60 FPS
+
+    def __init__(self, history=600):
+        self.samples = deque(maxlen=history)  # Krotki: (czas klatki, czasy faz...) w sekundach
+        self.visible = False  # Czy nakładka jest wyświetlana
+        self._index = {phase: i for i, phase in enumerate(self.PHASES)}
+        self._phases = [0.0] * len(self.PHASES)
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._overlay = None  # Ostatnio narysowana nakładka (odświeżana kilka razy na sekundę)
+        self._overlay_time = 0.0
+
+    def begin_frame(self):
+        self._frame_start = self._last = time.perf_counter()
+        self._phases = [0.0] * len(self.PHASES)
+
+    def mark(self, phase):
+        """Przypisuje czas od poprzedniego znacznika do podanej fazy."""
+        now = time.perf_counter()
+        self._phases[self._index[phase]] += now - self._last
+        self._last = now
+
+    def end_frame(self):
+        self.samples.append((self._last - self._frame_start, *self._phases))
+
+    def percentiles(self, column=0, q=(50, 95, 99)):
+        """Percentyle (ms) wybranej kolumny próbek: 0 - cała klatka, 1.. - kolejne fazy."""
+        if not self.samples:
+            return [0.0] * len(q)
+        values = np.array([sample[column] for sample in self.samples]) * 1000
+        return list(np.percentile(values, q))
+
+    def export_csv(self, path=None):
+        """Zapisuje próbki do pliku CSV (czasy w ms) i zwraca jego ścieżkę."""
+        if path is None:
+            path = time.strftime("profile_%Y%m%d_%H%M%S.csv")
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "total_ms", *(f"{phase}_ms" for phase in self.PHASES)])
+            for frame, sample in enumerate(self.samples):
+                writer.writerow([frame, *(f"{value * 1000:.3f}" for value in sample)])
+        return path
+
+    def _render_overlay(self, width):
+        font = text_cache.font(18)  # Zmienne napisy omijają pamięć napisów
+        bins, hist_height, line_height = 25, 40, 14
+        height = hist_height + 26 + line_height * len(self.PHASES)
+        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 170))
+
+        # Histogram czasów klatek (0-50 ms) z zaznaczonym budżetem 16.6 ms
+        totals = np.array([sample[0] for sample in self.samples]) * 1000
+        counts, _ = np.histogram(totals, bins=bins, range=(0, 50))
+        bar_width = width / bins
+        peak = max(1, counts.max()) if len(counts) else 1
+        for i, count in enumerate(counts):
+            bar_height = int(hist_height * count / peak)
+            if bar_height:
+                color = GREEN if (i + 1) * 2 <= self.BUDGET_MS else YELLOW
+                pygame.draw.rect(overlay, color, (int(i * bar_width), hist_height - bar_height,
+                                                  max(1, int(bar_width) - 1), bar_height))
+        budget_x = int(width * self.BUDGET_MS / 50)
+        pygame.draw.line(overlay, RED, (budget_x, 0), (budget_x, hist_height))
+
+        p50, p95, p99 = self.percentiles()
+        overlay.blit(font.render(f"p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f} ms", True, WHITE),
+                     (4, hist_height + 6))
+        for i, phase in enumerate(self.PHASES):  # Faza: p50 / p95 w ms
+            phase_p50, phase_p95 = self.percentiles(i + 1, (50, 95))
+            line_y = hist_height + 26 + i * line_height
+            overlay.blit(font.render(phase, True, WHITE), (4, line_y))
+            overlay.blit(font.render(f"{phase_p50:.2f} / {phase_p95:.2f}", True, WHITE), (width - 80, line_y))
+        return overlay
+
+    def draw(self, surface, x, y, width=200):
+        """Rysuje nakładkę (odświeżaną co 250 ms, aby sama nie obciążała klatki)."""
+        now = time.perf_counter()
+        if self._overlay is None or now - self._overlay_time >= 0.25:
+            self._overlay = self._render_overlay(width)
+            self._overlay_time = now
+        return surface.blit(self._overlay, (x, y))
+
+
+profiler = FrameProfiler()
+
+
+# Źródła wejścia
+class KeyboardInput:
+    """
+    Wejście z klawiatury i okien dialogowych (domyślne).
+    Jak każde źródło wejścia przekazuje wybory (nagroda za poziom, broń) do funkcji
+    done: tutaj dopiero po zamknięciu okna dialogowego, źródła skryptowe od razu.
+    """
+    finished = False  # Źródło wejścia nigdy się nie kończy
 
-        # Opcja wyjścia
-        exit_text = font.render("0: Exit selection", True, WHITE)
-        screen.blit(exit_text, (WIDTH // 2 - exit_text.get_width() // 2, HEIGHT // 2 + 50 + len(self.inventory["weapons"]) * 30))
+    def get_pressed(self):
+        return pygame.key.get_pressed()
 
-        pygame.display.flip()
+    def choose_upgrade(self, player, done):
+        scenes.push(level_up_scene(player, done))
 
-        # Obsługa zdarzeń
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_0:
-                    running = False
-                elif pygame.K_1 <= event.key <= pygame.K_9:
-                    index = event.key - pygame.K_1
-                    if 0 <= index < len(self.inventory["weapons"]):
-                        self.equipped_weapon = self.inventory["weapons"][index]
-                        self.apply_weapon_effect()
-                        print(f"Wybrana broń: {self.equipped_weapon}")
-                        running = False
-
-
-
-def show_main_menu():
-    """Shows main menu."""
-    font = pygame.font.Font(None, 72)
-    small_font = pygame.font.Font(None, 36)
-
-    while True:
-        screen.fill(BLACK)
-
-        # Teksty na ekranie menu
-        title_text = font.render("Roguelike Game", True, WHITE)
-        start_text = small_font.render("Press S to Start", True, WHITE)
-        exit_text = small_font.render("Press Q to Quit", True, WHITE)
-
-        # Wyświetlanie tekstów
-        screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 100))
-        screen.blit(start_text, (WIDTH // 2 - start_text.get_width() // 2, HEIGHT // 2))
-        screen.blit(exit_text, (WIDTH // 2 - exit_text.get_width() // 2, HEIGHT // 2 + 50))
-
-        pygame.display.flip()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_s:  # Start gry
-                    return True  # Rozpocznij grę
-                elif event.key == pygame.K_q:  # Wyjście z gry
-                    pygame.quit()
-                    exit()
-
-def show_pause_menu():
-    """Shows pause menu when ESC is pressed."""
-    font = pygame.font.Font(None, 72)
-    small_font = pygame.font.Font(None, 36)
-
-    while True:
-        screen.fill(BLACK)
-
-        # pause menu
-        title_text = font.render("Paused", True, WHITE)
-        resume_text = small_font.render("Press R to Resume", True, WHITE)
-        quit_text = small_font.render("Press Q to Quit", True, WHITE)
-
-        # show text
-        screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 100))
-        screen.blit(resume_text, (WIDTH // 2 - resume_text.get_width() // 2, HEIGHT // 2))
-        screen.blit(quit_text, (WIDTH // 2 - quit_text.get_width() // 2, HEIGHT // 2 + 50))
-
-        pygame.display.flip()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    return True
-                elif event.key == pygame.K_q:
-                    pygame.quit()
-                    exit()
-
-
-# Główna funkcja gry
-def main():
-    clock = pygame.time.Clock()
-    last_block_bats_defeated = 0  # Śledzenie liczby pokonanych nietoperzy przy ostatnim dodaniu bloku
-
-    MAP_WIDTH = 50  # Szerokość mapy w kafelkach
-    MAP_HEIGHT = 50  # Wysokość mapy w kafelkach
-
-    # Załaduj tło mapy
-    grass_tile = pygame.image.load("grass6.png")
-    grass_tile = pygame.transform.scale(grass_tile, (TILE_SIZE, TILE_SIZE))
-    holy_waters = []  # Lista aktywnych Holy Water
+    def choose_weapon(self, player, done):
+        scenes.push(weapon_selection_scene(player, done))
+
+
+class PressedKeys:
+    """Stan klawiszy zbudowany ze zbioru kodów, indeksowany jak pygame.key.get_pressed()."""
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class ScriptedInput:
+    """
+    Wejście sterowane skryptem (np. do testów bez okna).
+    script to lista zbiorów klawiszy na kolejne klatki albo funkcja script(tick) -> zbiór klawiszy.
+    Wybory nagród za poziom są brane kolejno (w kółko) z upgrades.
+    """
+    finished = False
+
+    def __init__(self, script, upgrades=(1,), weapon_choice=None):
+        self.script = script
+        self.upgrades = list(upgrades)
+        self.weapon_choice = weapon_choice  # Indeks broni wybieranej po K_i (None - bez zmiany)
+        self.tick = 0
+        self._upgrade_index = 0
+
+    def get_pressed(self):
+        if callable(self.script):
+            keys = self.script(self.tick)
+        elif self.tick < len(self.script):
+            keys = self.script[self.tick]
+        else:
+            keys = ()
+        self.tick += 1
+        return PressedKeys(keys)
+
+    def choose_upgrade(self, player, done):
+        choice = self.upgrades[self._upgrade_index % len(self.upgrades)]
+        self._upgrade_index += 1
+        done(choice)
+
+    def choose_weapon(self, player, done):
+        if self.weapon_choice is not None and self.weapon_choice < len(player.inventory["weapons"]):
+            done(self.weapon_choice)
+        else:
+            done(None)
+
+
+def random_keys_script(seed=0, hold_ticks=20):
+    """
+    Prosty skrypt-bot: co hold_ticks klatek losuje kierunek ruchu i strzału
+    oraz czasem rzuca Holy Water. Używa własnego generatora, więc nie zmienia
+    sekwencji losowej gry.
+    """
+    rng = random.Random(seed)
+    moves = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
+    shots = [pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d]
+    state = {"keys": ()}
+
+    def script(tick):
+        if tick % hold_ticks == 0:
+            keys = {rng.choice(moves), rng.choice(shots)}
+            if rng.random() < 0.2:
+                keys.add(pygame.K_h)
+            state["keys"] = keys
+        return state["keys"]
+
+    return script
+
+
+# Nagrywanie i odtwarzanie rozgrywki
+REPLAY_MAGIC = b"RGLR"
+REPLAY_VERSION = 3
+REPLAY_HEADER = "<4sBqIIId"  # Znacznik, wersja, ziarno RNG, czas startu (ms), rozmiar mapy, krok logiki (ms)
+RECORDED_KEYS = (
+    pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT,
+    pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d,
+    pygame.K_h, pygame.K_i,
+)
+# Rodzaje rekordów logu: klawisze kroku logiki, nagroda za poziom, wybór broni
+REPLAY_RECORDS = {b"K": "<H", b"U": "<B", b"W": "<B"}
+NO_WEAPON = 255  # Zapis "bez zmiany broni" w rekordzie W
+
+
+def keys_to_mask(keys):
+    """Zamienia stan klawiszy na maskę bitową nagrywanych klawiszy."""
+    mask = 0
+    for bit, key in enumerate(RECORDED_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+def mask_to_keys(mask):
+    """Odtwarza stan klawiszy z maski bitowej."""
+    return PressedKeys(key for bit, key in enumerate(RECORDED_KEYS) if mask >> bit & 1)
+
+
+class InputRecorder:
+    """
+    Nagrywa ziarno RNG, rozmiar mapy, stan klawiszy w każdym kroku logiki i wybory
+    z okien dialogowych do zwartego (skompresowanego) logu binarnego.
+    Czas gry rośnie stałymi krokami zegara (patrz clock()), więc odtworzenie logu
+    daje dokładnie ten sam przebieg gry niezależnie od tempa rysowania.
+    """
+    finished = False
+
+    def __init__(self, source, seed, map_size=(MAP_WIDTH, MAP_HEIGHT)):
+        self.source = source  # Nagrywane źródło wejścia
+        self.seed = seed
+        self.map_size = map_size
+        self.start_ms = 0
+        self.step_ms = TICK_MS
+        self._body = bytearray()
+
+    def _write(self, kind, value):
+        self._body += kind + struct.pack(REPLAY_RECORDS[kind], value)
+
+    def get_pressed(self):
+        mask = keys_to_mask(self.source.get_pressed())
+        self._write(b"K", mask)
+        return mask_to_keys(mask)  # Gra widzi tylko to, co da się odtworzyć
+
+    def choose_upgrade(self, player, done):
+        def record(choice):
+            self._write(b"U", choice)
+            done(choice)
+        self.source.choose_upgrade(player, record)
+
+    def choose_weapon(self, player, done):
+        def record(index):
+            self._write(b"W", NO_WEAPON if index is None else index)
+            done(index)
+        self.source.choose_weapon(player, record)
+
+    def clock(self, clock):
+        """Zapamiętuje początek i krok zegara logiki (odtworzenie użyje tych samych); zwraca ten zegar."""
+        self.start_ms = clock.get_ticks()
+        self.step_ms = clock.step_ms
+        return clock
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(struct.pack(REPLAY_HEADER, REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.start_ms,
+                                   *self.map_size, self.step_ms))
+            file.write(zlib.compress(bytes(self._body), 9))
+
+
+class InputReplayer:
+    """
+    Odtwarza log nagrany przez InputRecorder: klawisze i wybory, krok po kroku.
+    speed to mnożnik tempa odtwarzania (1 - czas rzeczywisty, 0 - najszybciej jak się da).
+    """
+    def __init__(self, path, speed=0):
+        with open(path, "rb") as file:
+            data = file.read()
+        header_size = struct.calcsize(REPLAY_HEADER)
+        header = struct.unpack_from(REPLAY_HEADER, data)
+        magic, version, self.seed, self.start_ms, *self.map_size, self.step_ms = header
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} nie jest nagraniem rozgrywki w wersji {REPLAY_VERSION}")
+        self._body = zlib.decompress(data[header_size:])
+        self._pos = 0
+        self.speed = speed
+        self.finished = False  # Czy log się skończył
+
+    def _read(self, kind):
+        if self._pos >= len(self._body):
+            self.finished = True
+            return None
+        actual = self._body[self._pos:self._pos + 1]
+        if actual != kind:
+            raise ValueError(f"Nagranie rozjechało się z grą: oczekiwano {kind!r}, jest {actual!r}")
+        record_format = REPLAY_RECORDS[kind]
+        (value,) = struct.unpack_from(record_format, self._body, self._pos + 1)
+        self._pos += 1 + struct.calcsize(record_format)
+        return value
+
+    def get_pressed(self):
+        mask = self._read(b"K")
+        return mask_to_keys(mask or 0)
+
+    def choose_upgrade(self, player, done):
+        choice = self._read(b"U")
+        done(1 if choice is None else choice)
+
+    def choose_weapon(self, player, done):
+        index = self._read(b"W")
+        done(None if index in (None, NO_WEAPON) else index)
+
+    def clock(self):
+        """Zegar logiki nagrania: bez czekania (speed 0) albo w czasie rzeczywistym razy speed."""
+        if self.speed > 0:
+            return FixedStepClock(step_ms=self.step_ms, start_ms=self.start_ms, speed=self.speed)
+        return SimulatedClock(self.step_ms, self.start_ms)
+
+
+# Zapis i wczytywanie stanu gry
+SAVE_MAGIC = b"RGLS"
+SAVE_VERSION = 3
+SAVE_HEADER = "<4sB"  # Znacznik, wersja; dalej skompresowane ciało migawki
+SAVE_PATH = "roguelike.sav"  # Domyślny plik zapisu
+AUTOSAVE_INTERVAL = 30000  # Co ile ms czasu gry zapisywać stan w tle
+NO_TEXT = 0xFFFF  # Długość tekstu oznaczająca None
+
+
+class SnapshotWriter:
+    """Bufor ciała migawki: liczby przez struct, teksty z długością, tablice NumPy w całości."""
+    def __init__(self):
+        self.data = bytearray()
+
+    def put(self, fmt, *values):
+        self.data += struct.pack(fmt, *values)
+
+    def text(self, value):
+        if value is None:
+            self.put("<H", NO_TEXT)
+            return
+        encoded = value.encode("utf-8")
+        self.put("<H", len(encoded))
+        self.data += encoded
+
+    def array(self, values, dtype):
+        values = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<")).ravel()
+        self.put("<I", len(values))
+        self.data += values.tobytes()
+
+
+class SnapshotReader:
+    """Odczyt ciała migawki zapisanego przez SnapshotWriter, w tej samej kolejności."""
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def text(self):
+        (size,) = self.take("<H")
+        if size == NO_TEXT:
+            return None
+        value = self.data[self.pos:self.pos + size].decode("utf-8")
+        self.pos += size
+        return value
+
+    def array(self, dtype):
+        (count,) = self.take("<I")
+        dtype = np.dtype(dtype).newbyteorder("<")
+        values = np.frombuffer(self.data, dtype=dtype, count=count, offset=self.pos)
+        self.pos += count * dtype.itemsize
+        return values.astype(dtype.newbyteorder("="))
+
+
+def encode_snapshot(snapshot):
+    """Zamienia migawkę z GameScene.snapshot() na zwarty, skompresowany zapis binarny."""
+    writer = SnapshotWriter()
+    writer.put("<qII", snapshot["now"], *snapshot["map_size"])
+    writer.array(snapshot["scene"], np.int64)
+
+    version, state, gauss = snapshot["rng"]
+    writer.put("<B?d", version, gauss is not None, gauss or 0.0)
+    writer.array(state, np.uint32)
+
+    player = snapshot["player"]
+    writer.array(player["stats"], np.int64)
+    writer.array(player["times"], np.int64)
+    writer.put("<?H", player["facing_left"], len(player["weapons"]))
+    for weapon in player["weapons"]:
+        writer.text(weapon)
+    writer.text(player["shield"])
+    writer.text(player["equipped_weapon"])
+
+    enemies = snapshot["enemies"]
+    writer.put("<Iq", enemies["capacity"], enemies["spawned"])
+    for name in ("slot", "free"):
+        writer.array(enemies[name], np.int64)
+    for name, dtype in EnemyGroup.SAVED_COLUMNS:
+        writer.array(enemies[name], dtype)
+
+    writer.put("<I", len(snapshot["items"]))
+    for x, y, item_type in snapshot["items"]:
+        writer.put("<ii", x, y)
+        writer.text(item_type)
+
+    for (_, dtype), column in zip(AreaEffects.COLUMNS, snapshot["effects"]):
+        writer.array(column, dtype)
+
+    writer.put("<I", len(snapshot["blocks"]))
+    for x, y, is_active, explosion_time, tiles in snapshot["blocks"]:
+        writer.put("<ii??q", x, y, is_active, explosion_time is not None, explosion_time or 0)
+        writer.array(tiles, np.int32)
+
+    for column in snapshot["projectiles"]:
+        writer.array(column, np.float64)
+
+    return struct.pack(SAVE_HEADER, SAVE_MAGIC, SAVE_VERSION) + zlib.compress(bytes(writer.data), 1)
+
+
+def decode_snapshot(data):
+    """Odczytuje migawkę zapisaną przez encode_snapshot()."""
+    magic, version = struct.unpack_from(SAVE_HEADER, data)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        raise ValueError(f"To nie jest zapis gry w wersji {SAVE_VERSION}")
+    reader = SnapshotReader(zlib.decompress(data[struct.calcsize(SAVE_HEADER):]))
+    now, map_width, map_height = reader.take("<qII")
+    snapshot = {"now": now, "map_size": (map_width, map_height), "scene": reader.array(np.int64).tolist()}
+
+    version, has_gauss, gauss = reader.take("<B?d")
+    snapshot["rng"] = (version, tuple(reader.array(np.uint32).tolist()), gauss if has_gauss else None)
+
+    stats = reader.array(np.int64).tolist()
+    times = reader.array(np.int64).tolist()
+    facing_left, weapon_count = reader.take("<?H")
+    weapons = [reader.text() for _ in range(weapon_count)]
+    snapshot["player"] = {
+        "stats": stats,
+        "times": times,
+        "facing_left": facing_left,
+        "weapons": weapons,
+        "shield": reader.text(),
+        "equipped_weapon": reader.text(),
+    }
+
+    capacity, spawned = reader.take("<Iq")
+    enemies = {"capacity": capacity, "spawned": spawned}
+    for name in ("slot", "free"):
+        enemies[name] = reader.array(np.int64)
+    for name, dtype in EnemyGroup.SAVED_COLUMNS:
+        enemies[name] = reader.array(dtype)
+    snapshot["enemies"] = enemies
+
+    (count,) = reader.take("<I")
+    snapshot["items"] = [(*reader.take("<ii"), reader.text()) for _ in range(count)]
+
+    snapshot["effects"] = tuple(reader.array(dtype) for _, dtype in AreaEffects.COLUMNS)
+
+    (count,) = reader.take("<I")
     blocks = []
+    for _ in range(count):
+        x, y, is_active, exploding, explosion_time = reader.take("<ii??q")
+        tiles = reader.array(np.int32).reshape(-1, 2).tolist()
+        blocks.append((x, y, is_active, explosion_time if exploding else None, [tuple(tile) for tile in tiles]))
+    snapshot["blocks"] = blocks
 
-    game_map = generate_map_vampire_style(MAP_WIDTH, MAP_HEIGHT)
-    player = Player(10, 10)
-    enemies = [Enemy(random.randint(0, MAP_WIDTH - 1), random.randint(0, MAP_HEIGHT - 1), 50, 10) for _ in range(10)]
-    camera = Camera(WIDTH, HEIGHT)
+    snapshot["projectiles"] = tuple(reader.array(np.float64) for _ in range(5))
+    return snapshot
 
-    projectiles = []  # Lista pocisków
-    minimap_size = (200, 150)  # Rozmiar minimapy
-    items = []
 
-    # Sterowanie liczbą przeciwników
+def save_snapshot(path, snapshot):
+    """Zapisuje migawkę do pliku (przez plik tymczasowy, więc stary zapis nigdy nie jest uszkodzony)."""
+    data = encode_snapshot(snapshot)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def load_snapshot(path):
+    with open(path, "rb") as file:
+        return decode_snapshot(file.read())
+
+
+class Autosaver:
+    """
+    Zapis stanu gry w tle. Wątek gry przekazuje tylko migawkę (kopię stanu,
+    której gra już nie zmienia), a kodowanie, kompresję i zapis na dysk
+    wykonuje wątek roboczy. Jeśli poprzedni zapis jeszcze trwa, czeka tylko
+    najnowsza migawka.
+    """
+    def __init__(self):
+        self.saves = 0
+        self.last_save_ms = 0.0  # Czas ostatniego zapisu w wątku roboczym
+        self._pending = None  # (ścieżka, migawka) czekająca na zapis
+        self._busy = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def save(self, path, snapshot):
+        with self._condition:
+            self._pending = (path, snapshot)
+            self._condition.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Czeka, aż oczekujący zapis trafi na dysk."""
+        with self._condition:
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                path, snapshot = self._pending
+                self._pending = None
+                self._busy = True
+            start = time.perf_counter()
+            try:
+                save_snapshot(path, snapshot)
+            except OSError as error:
+                game_log.warning("Nie udało się zapisać gry do %s: %s", path, error)
+            except Exception:  # Błąd kodowania nie może zatrzymać wątku (flush() czekałby w nieskończoność)
+                game_log.exception("Nie udało się zakodować zapisu gry do %s", path)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self.saves += 1
+                    self.last_save_ms = (time.perf_counter() - start) * 1000
+                    self._condition.notify_all()
+
+
+autosaver = Autosaver()
+
+
+# Rozgrywka
+class GameScene(Scene):
+    """
+    Rozgrywka: cały stan świata oraz jedna klatka logiki i rysowania na frame().
+    Leży na dnie stosu scen; menu i okna dialogowe nad nią wstrzymują grę.
+    """
+    modal = False
+    # Sterowanie liczbą przeciwników (parametry balansu, patrz balance.py)
     max_enemies = 10
     spawn_interval = 2000  # Co ile milisekund spawnujemy nowego przeciwnika
-    last_spawn_time = pygame.time.get_ticks()
+    # Limity tablic roju i pocisków (None - bez limitu); liczniki w pool_stats()
+    max_enemy_rows = None
+    max_projectiles = 4096
+
+    def __init__(self, input_source, headless=False, map_size=(MAP_WIDTH, MAP_HEIGHT), save_path=None):
+        super().__init__()
+        self.input_source = input_source
+        self.headless = headless
+        self.map_size = map_size
+        self.save_path = save_path  # Plik zapisu (autozapis, F5/F9); None wyłącza zapis
+        timers.clear()  # Terminy poprzedniej rozgrywki
+        self.last_block_bats_defeated = 0  # Śledzenie liczby pokonanych nietoperzy przy ostatnim dodaniu bloku
+
+        self.effects = AreaEffects()  # Strefy obrażeń obszarowych (Holy Water, wybuchy)
+        self.blocks = TileIndex()  # Bloki wybuchowe według kafelków
+
+        self.game_map = generate_map_vampire_style(*map_size)
+        self.player = Player(10, 10)
+        self.enemies = EnemyGroup(max_capacity=self.max_enemy_rows)
+        for _ in range(10):
+            self.enemies.spawn(*self.spawn_position(), 50, 10)
+        self.camera = Camera(WIDTH, HEIGHT, *map_size)
+        self.camera.update(self.player)
+        self.flow_field = FlowField()
+
+        self.projectiles = ProjectileSystem(max_capacity=self.max_projectiles)  # Wszystkie pociski
+        self.minimap_size = (200, 150)  # Rozmiar minimapy
+        self.items = TileIndex(pool=item_pool)  # Przedmioty leżące na mapie według kafelków
+
+        self.last_spawn_time = game_clock.get_ticks()
+        self.start_time = self.last_spawn_time
+        self.last_autosave_time = self.last_spawn_time
+        self.ticks = 0
+        self.steps_due = 1  # Kroki logiki do wykonania przed rysowaniem tej klatki
+        self.over = False  # Koniec rozgrywki (koniec nagrania albo śmierć w trybie headless)
+        self.weapon_requested = False  # Wciśnięto K_i - wybór broni na końcu klatki
+        self._suspended = False  # Klatka czeka na zamknięcie okna dialogowego
+
+    def restart(self):
+        """Zastępuje rozgrywkę nową, z tym samym źródłem wejścia."""
+        scenes.replace(GameScene(self.input_source, self.headless, self.map_size, self.save_path))
+
+    @property
+    def has_save(self):
+        return self.save_path is not None and os.path.exists(self.save_path)
+
+    def pool_stats(self):
+        """Liczniki ponownego użycia: wiersze roju, tablice pocisków i pula przedmiotów."""
+        return {
+            "enemies": self.enemies.stats(),
+            "projectiles": self.projectiles.stats(),
+            "items": item_pool.stats(),
+        }
 
-    if not show_main_menu():
-        return
+    def snapshot(self):
+        """
+        Migawka stanu rozgrywki: same liczby, teksty i kopie tablic, więc może być
+        kodowana w innym wątku, podczas gdy gra toczy się dalej.
+        """
+        return {
+            "now": game_clock.get_ticks(),
+            "map_size": self.map_size,
+            "scene": [self.ticks, self.last_block_bats_defeated, self.max_enemies, self.spawn_interval,
+                      self.last_spawn_time, self.start_time],
+            "rng": random.getstate(),
+            "player": self.player.snapshot(),
+            "enemies": self.enemies.snapshot(),
+            "items": [(item.x, item.y, item.item_type) for item in self.items],
+            "effects": self.effects.snapshot(),
+            "blocks": [(block.x, block.y, block.is_active, block.explosion_time, list(block.explosion_tiles))
+                       for block in self.blocks],
+            "projectiles": self.projectiles.snapshot(),
+        }
 
-    # Pętla gry
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    if not show_pause_menu():
-                        running = False
-                        break
+    @classmethod
+    def from_snapshot(cls, snapshot, input_source, headless=False, save_path=None):
+        """Rozgrywka odtworzona z migawki (np. z pliku zapisu)."""
+        game = cls(input_source, headless, tuple(snapshot["map_size"]), save_path)
+        game.restore(snapshot)
+        return game
+
+    def restore(self, snapshot):
+        """Zastępuje stan świata stanem z migawki; czasy są przesuwane na bieżący zegar."""
+        timers.clear()
+        shift = game_clock.get_ticks() - snapshot["now"]
+        (self.ticks, self.last_block_bats_defeated, self.max_enemies, self.spawn_interval,
+         last_spawn_time, start_time) = snapshot["scene"]
+        self.last_spawn_time = last_spawn_time + shift
+        self.start_time = start_time + shift
+        self.last_autosave_time = game_clock.get_ticks()
+
+        self.player = Player.from_snapshot(snapshot["player"], shift)
+        self.enemies = EnemyGroup(max_capacity=self.max_enemy_rows)
+        self.enemies.restore(snapshot["enemies"], shift)
+        self.items = TileIndex(pool=item_pool)
+        for x, y, item_type in snapshot["items"]:
+            self.items.append(item_pool.acquire(x, y, item_type))
+
+        # Strefy obszarowe, a eksplozje bloków razem ze swoimi terminami w timers
+        self.effects = AreaEffects()
+        self.effects.restore(snapshot["effects"], shift)
+        self.blocks = TileIndex()
+        for x, y, is_active, explosion_time, tiles in snapshot["blocks"]:
+            block = ExplosiveBlock(x, y)
+            block.is_active = is_active
+            block.explosion_tiles = tiles
+            block.on_finished = self.blocks.remove
+            if explosion_time is not None:
+                block.explosion_time = explosion_time + shift
+                timers.schedule_at(block.explosion_time + block.explosion_duration + 1, block.finish_explosion)
+            self.blocks.append(block)
+
+        self.projectiles = ProjectileSystem(max_capacity=self.max_projectiles)
+        self.projectiles.restore(snapshot["projectiles"])
+        self.camera.update(self.player)
+        random.setstate(snapshot["rng"])  # Na końcu, bo tworzenie obiektów też losuje
+        screen_updater.invalidate()
+
+    def save(self):
+        """Migawka w wątku gry; kodowanie i zapis na dysk w tle (autosaver)."""
+        autosaver.save(self.save_path, self.snapshot())
+        self.last_autosave_time = game_clock.get_ticks()
+
+    @classmethod
+    def from_file(cls, path, input_source, headless=False, save_path=None):
+        """Rozgrywka wczytana z pliku zapisu albo None, jeśli zapisu nie da się odczytać."""
+        autosaver.flush()  # Najpierw dokończ trwający zapis
+        try:
+            snapshot = load_snapshot(path)
+        except (OSError, ValueError, zlib.error, struct.error) as error:
+            game_log.warning("Nie udało się wczytać gry z %s: %s", path, error)
+            return None
+        return cls.from_snapshot(snapshot, input_source, headless, save_path)
+
+    def load(self):
+        """Zastępuje rozgrywkę stanem z pliku zapisu."""
+        game = GameScene.from_file(self.save_path, self.input_source, self.headless, self.save_path)
+        if game is not None:
+            scenes.replace(game)
+
+    def spawn_position(self, margin=0):
+        """Losowy kafelek w promieniu SPAWN_RADIUS od gracza (margin - odstęp od krawędzi mapy)."""
+        map_width, map_height = self.map_size
+        x, y = self.player.x, self.player.y
+        return (random.randint(max(margin, x - SPAWN_RADIUS), min(map_width - 1 - margin, x + SPAWN_RADIUS)),
+                random.randint(max(margin, y - SPAWN_RADIUS), min(map_height - 1 - margin, y + SPAWN_RADIUS)))
+
+    def equip(self, weapon_index):
+        if weapon_index is not None:
+            self.player.equip_weapon(weapon_index)
+
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            scenes.clear()
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                scenes.push(pause_menu_scene())
+            elif event.key == pygame.K_F3:  # Nakładka profilera
+                profiler.visible = not profiler.visible
+            elif event.key == pygame.K_F4:  # Eksport próbek profilera
+                game_log.info("Zapisano profil klatek: %s", profiler.export_csv())
+                game_log.info("Pule obiektów: %s", self.pool_stats())
+            elif event.key == pygame.K_F5 and self.save_path:  # Szybki zapis
+                self.save()
+            elif event.key == pygame.K_F9 and self.save_path:  # Szybkie wczytanie
+                self.load()
+
+    def frame(self):
+        """
+        Jedna klatka: zdarzenia, zaległe kroki logiki (każdy z wyborami z okien
+        dialogowych i krokiem zegara), rysowanie z interpolacją między krokami
+        i czekanie na kolejną klatkę. Okno otwarte w trakcie kroku wstrzymuje go
+        przed krokiem zegara; po jego zamknięciu frame() dokańcza ten sam krok,
+        dzięki czemu nagranie zawiera wybory w tym samym miejscu, w którym
+        odczyta je odtwarzanie.
+        """
+        if self.dirty:  # Nowa albo odsłonięta rozgrywka: czasu spędzonego w menu nie nadrabiamy
+            game_clock.resume()
+            self.dirty = False
+        profiler.begin_frame()  # Po zamknięciu okna także od nowa: czas z otwartym oknem nie trafia do próbki
+        if not self._suspended:
+            if not self.headless:
+                for event in pygame.event.get():
+                    self.handle_event(event)
+                    if scenes.top is not self:  # Otwarte menu wstrzymuje grę od tej klatki
+                        return
+            profiler.mark("events")
+
+        while self._suspended or self.steps_due:
+            if not self._suspended:
+                self.update()
+                if self.over:
+                    return
+
+            self.resolve_choices()
+            self._suspended = scenes.top is not self
+            if self._suspended:
+                return
+            game_clock.step()
+            self.ticks += 1
+            self.steps_due -= 1
+
+            # Autozapis między krokami, gdy stan jest spójny
+            if self.save_path and game_clock.get_ticks() - self.last_autosave_time >= AUTOSAVE_INTERVAL:
+                self.save()
+
+        if not self.headless:
+            self.draw(screen, game_clock.alpha)
+        profiler.end_frame()
+
+        self.steps_due = game_clock.tick(RENDER_FPS)
+        startup.mark("game")
+
+    def resolve_choices(self):
+        """Wybór broni i nagród za poziom: od razu ze źródła wejścia albo w oknie dialogowym."""
+        player = self.player
+        if self.weapon_requested and scenes.top is self:
+            self.weapon_requested = False
+            self.input_source.choose_weapon(player, self.equip)
+        while player.pending_upgrades and scenes.top is self:
+            player.pending_upgrades -= 1
+            self.input_source.choose_upgrade(player, player.apply_upgrade)
 
+    def update(self):
+        """Jeden krok logiki: sterowanie, przeciwnicy, pociski, kolizje, kamera."""
+        player = self.player
+        enemies = self.enemies
+        input_source = self.input_source
+        player.remember_position()
+        enemies.remember_positions()
 
         # Sterowanie graczem
         moving = False
-        keys = pygame.key.get_pressed()
+        keys = input_source.get_pressed()
+        if input_source.finished:  # Koniec nagrania
+            self.over = True
+            return
         if keys[pygame.K_UP]:
-            player.move(0, -1, game_map)
+            player.move(0, -1, self.game_map)
             moving = True
         if keys[pygame.K_DOWN]:
-            player.move(0, 1, game_map)
+            player.move(0, 1, self.game_map)
             moving = True
         if keys[pygame.K_LEFT]:
-            player.move(-1, 0, game_map)
+            player.move(-1, 0, self.game_map)
             moving = True
         if keys[pygame.K_RIGHT]:
-            player.move(1, 0, game_map)
+            player.move(1, 0, self.game_map)
             moving = True
         if keys[pygame.K_i]:
-            show_weapon_selection(player)
+            self.weapon_requested = True
 
         player.update_animation(moving)
 
         # Strzelanie pociskami
         if keys[pygame.K_w]:
-            player.shoot(projectiles, (0, -1))
+            player.shoot(self.projectiles, (0, -1))
         if keys[pygame.K_s]:
-            player.shoot(projectiles, (0, 1))
+            player.shoot(self.projectiles, (0, 1))
         if keys[pygame.K_a]:
-            player.shoot(projectiles, (-1, 0))
+            player.shoot(self.projectiles, (-1, 0))
         if keys[pygame.K_d]:
-            player.shoot(projectiles, (1, 0))
+            player.shoot(self.projectiles, (1, 0))
 
         # Rzucanie Holy Water
         if keys[pygame.K_h]:
-            player.throw_holy_water(holy_waters)
+            player.throw_holy_water(self.effects)
+        profiler.mark("input")
 
         # Dodawanie nowego przeciwnika co określony czas
-        current_time = pygame.time.get_ticks()
-        if current_time - last_spawn_time >= spawn_interval and len(enemies) < max_enemies:
-            last_spawn_time = current_time
-            enemies.append(Enemy(random.randint(0, MAP_WIDTH - 1), random.randint(0, MAP_HEIGHT - 1), 50, 10))
-
-        player.pick_item(items)
-
-        # Aktualizacja pozycji przeciwników
-        for enemy in enemies[:]:  # Iterujemy po kopii listy
-            enemy.move_towards_player(player)
-            if enemy.hp <= 0 and not enemy.is_dead:  # Sprawdzanie śmierci przeciwnika
-                enemy.is_dead = True
-                player.bats_defeated += 1
+        current_time = game_clock.get_ticks()
+        if current_time - self.last_spawn_time >= self.spawn_interval and len(enemies) < self.max_enemies:
+            self.last_spawn_time = current_time
+            enemy = enemies.spawn(*self.spawn_position(), 50, 10)
+            if enemy is not None:
+                spawn_log.debug("Nowy przeciwnik na pozycji (%d, %d)", enemy.x, enemy.y)
+
+        player.pick_item(self.items)
+
+        # Aktualizacja całego roju naraz (wspólne pole przepływu od gracza)
+        self.flow_field.update(self.game_map, player.x, player.y)
+        enemies.move_towards_player(player, self.flow_field)
+        enemies.animate()
+        enemies.detect_deaths(player)  # Sprawdzanie śmierci przeciwników
+        profiler.mark("enemy_ai")
 
         # Ruch pocisków i sprawdzanie kolizji
-        for projectile in projectiles[:]:
-            projectile.move()  # Pocisk się porusza
-
-            for block in blocks:
-                if block.is_active and projectile.x // TILE_SIZE == block.x and projectile.y // TILE_SIZE == block.y:
-                    block.explode(enemies, player)  # Wywołanie eksplozji
-                    projectiles.remove(projectile)
-                    break
-
-            # Sprawdź, czy pocisk jest w granicach mapy
-            if not (0 <= projectile.x <= MAP_WIDTH * TILE_SIZE and
-                    0 <= projectile.y <= MAP_HEIGHT * TILE_SIZE):
-                projectiles.remove(projectile)
-                continue
-
-            # Sprawdź kolizję pocisku z przeciwnikiem
-            for enemy in enemies[:]:
-                enemy_center_x, enemy_center_y = enemy.get_center()
-                tolerance = TILE_SIZE // 2  # Tolerancja na trafienie
-                if abs(projectile.x - enemy_center_x) <= tolerance and \
-                        abs(projectile.y - enemy_center_y) <= tolerance:
-                    enemy.take_damage(player.damage, player)  # Dodano przekazanie player
-                    if enemy.hp <= 0:  # Jeśli przeciwnik zginął, usuń go
-                        player.gain_exp(20)
-                        enemy.drop_item(items)  # Zrzucanie przedmiotu
-                        print(f"Aktualna lista przedmiotów: {[item.item_type for item in items]}")
-                        enemies.remove(enemy)  # Usuwamy przeciwnika z listy
-                        player.quest_progress += 1  # Zwiększ postęp zadania
-                        player.check_quest_completion()
-                    projectiles.remove(projectile)
-                    break
+        self.projectiles.update(*self.map_size, self.blocks, enemies, player, self.items, self.effects)
+        profiler.mark("projectiles")
 
         # Kolizja gracza z przeciwnikami
-        for enemy in enemies:
-            if player.x == enemy.x and player.y == enemy.y:
-                if current_time - player.last_damage_time >= 1000:  # Ograniczenie czasu otrzymania obrażeń
-                    player.take_damage(enemy.damage)
-                    player.last_damage_time = current_time
-
+        for enemy in enemies.query_point(player.x, player.y):
+            if current_time - player.last_damage_time >= 1000:  # Ograniczenie czasu otrzymania obrażeń
+                player.take_damage(enemy.damage)
+                player.last_damage_time = current_time
 
         # Sprawdzenie, czy gracz zginął
         if player.hp <= 0:
-            if show_death_screen():
-                return main()  # Restart gry
-            else:
-                running = False
-                break
-
-        # Aktualizacja kamery
-        camera.update(player)
-
-        # Rysowanie ekranu
-        screen.fill(BLACK)  # Wyczyść ekran
-
-        # Rysowanie mapy w oparciu o kafelki
-        draw_map(screen, game_map, camera)
-
-        for item in items:
-            item.draw(screen, camera)
-
-        for enemy in enemies:
-            enemy.draw(screen, camera)
-
-        if player.bats_defeated % 5 == 0 and player.bats_defeated > last_block_bats_defeated:
-            blocks.append(ExplosiveBlock(random.randint(1, MAP_WIDTH - 2), random.randint(1, MAP_HEIGHT - 2)))
-            last_block_bats_defeated = player.bats_defeated  # Aktualizacja liczby pokonanych nietoperzy
-
-        # Rysowanie obiektów gry
-        for enemy in enemies:
-            enemy.draw(screen, camera)
-        for projectile in projectiles:
-            projectile.draw(screen, camera)
-        player.draw(screen, camera)
-
-        # Obsługa i rysowanie Holy Water
-        for holy_water in holy_waters[:]:
-            if holy_water.is_active():  # Sprawdzamy, czy Holy Water nadal działa
-                holy_water.draw(screen, camera)  # Rysowanie obiektu Holy Water
-                holy_water.check_collision(enemies, player)  # Sprawdzanie kolizji
+            if self.headless:
+                self.over = True
             else:
-                holy_waters.remove(holy_water)  # Usuń, jeśli czas działania upłynął
+                scenes.push(death_scene(self.restart, self.load if self.has_save else None))
+            return
 
-        Player.draw_xp_bar(screen,player)
-        player.draw_inventory(screen)
+        # Nowy blok wybuchowy co 5 pokonanych nietoperzy
+        if player.bats_defeated % 5 == 0 and player.bats_defeated > self.last_block_bats_defeated:
+            block = ExplosiveBlock(*self.spawn_position(margin=1))
+            block.on_finished = self.blocks.remove  # Wybuchł i eksplozja się skończyła
+            self.blocks.append(block)
+            spawn_log.debug("Nowy blok wybuchowy na pozycji (%d, %d)", block.x, block.y)
+            self.last_block_bats_defeated = player.bats_defeated  # Aktualizacja liczby pokonanych nietoperzy
+
+        # Terminy, które minęły: zakończone eksplozje
+        timers.run()
+
+        # Strefy obszarowe: kałuże Holy Water i wybuchy bloków
+        self.effects.update(enemies, player)
+
+        # Aktualizacja kamery; fragmenty mapy daleko od gracza opuszczają pamięć
+        self.camera.update(player)
+        self.game_map.focus(player.x, player.y)
+        profiler.mark("holy_water_blocks")
+
+    def draw(self, surface, alpha=1.0):
+        """Rysuje świat w położeniu między dwoma ostatnimi krokami logiki (alpha 0..1) i HUD."""
+        player = self.player
+        camera = self.camera.interpolated(alpha)
+
+        # Rysowanie ekranu: tło mapy (całe lub tylko pod zmienionymi miejscami)
+        screen_updater.begin(surface, self.game_map, camera)
+        dirty = screen_updater.add
+
+        # Rysowanie obiektów gry (warstwami, tylko widoczne)
+        dirty(draw_items(surface, self.items, camera))
+        dirty(self.enemies.draw(surface, camera, alpha))
+        dirty(self.projectiles.draw(surface, camera, alpha))
+        dirty(player.draw(surface, camera, alpha))
+        dirty(self.effects.draw(surface, camera))
+        dirty(draw_blocks(surface, self.blocks, camera))
+        profiler.mark("world_draw")
+
+        minimap_size = self.minimap_size
+        dirty(Player.draw_xp_bar(surface, player))
+        dirty(player.draw_inventory(surface))
         minimap_x = WIDTH - minimap_size[0] - 10
         minimap_y = 10
-        draw_minimap(screen, game_map, player, enemies, minimap_size, minimap_x, minimap_y)
-
-        player.draw_quest_status(screen, minimap_x, minimap_y, minimap_size[0], minimap_size[1])
-
-        for block in blocks[:]:
-            block.update()
-            block.draw(screen, camera)
-
-        # Aktualizacja wyświetlacza
-        pygame.display.flip()
-        clock.tick(60)
-        print(blocks)
+        dirty(draw_minimap(surface, self.game_map, player, self.enemies, minimap_size, minimap_x, minimap_y))
+
+        dirty(player.draw_quest_status(surface, minimap_x, minimap_y, minimap_size[0], minimap_size[1]))
+        if profiler.visible:
+            dirty(profiler.draw(surface, minimap_x, minimap_y + minimap_size[1] + 35, minimap_size[0]))
+        profiler.mark("hud")
+
+        # Aktualizacja wyświetlacza (cały ekran albo prostokąty zmian)
+        screen_updater.present()
+        profiler.mark("flip")
+
+
+def startup_assets():
+    """Grafiki pierwszych klatek rozgrywki (ścieżka, rozmiar, odbicie), wczytywane w tle za menu."""
+    sprite = (TILE_SIZE * 2, TILE_SIZE * 2)
+    tile = (TILE_SIZE, TILE_SIZE)
+    specs = [(f"walk{i}.png", sprite, flip) for flip in (False, True) for i in range(1, 7)]
+    specs += [("idle.png", sprite, False), ("idle.png", sprite, True)]
+    specs += [(f"enemywalk{i}.png", Enemy.target_size, False) for i in range(1, 4)]
+    specs += [(f"{name}.png", tile, False) for name in ("weapon1", "weapon2", "weapon3", "shield1", "explo", "explo2")]
+    specs += [("holywater.png", (size, size), False) for size in Player.holy_water_sizes()]
+    specs += [("grass6.png", GRASS_TEXTURE_SIZE, False)]
+    return specs
+
+
+def main(headless=False, input_source=None, clock=None, max_ticks=None, seed=None, show_menu=True,
+         dirty_rects=False, map_size=(MAP_WIDTH, MAP_HEIGHT), save_path=None, load_path=None,
+         startup_report=False):
+    """
+    Uruchamia grę. W trybie headless pomija menu i rysowanie, czas płynie według
+    zegara symulowanego, a po śmierci gracza (lub po max_ticks krokach logiki) zwracane
+    są statystyki rozgrywki zamiast ekranu śmierci. W oknie logika biegnie stałym
+    krokiem (FixedStepClock), a rysowanie interpoluje między krokami. dirty_rects włącza
+    odświeżanie tylko zmienionych fragmentów ekranu (patrz ScreenUpdater),
+    a map_size to rozmiar świata w kafelkach (patrz ChunkedMap). save_path włącza
+    autozapis do tego pliku (oraz F5/F9), a load_path wczytuje rozgrywkę z zapisu.
+    Menu pojawia się od razu: grafiki wczytują się w tle, a świat powstaje
+    dopiero po wyborze w menu. startup_report wypisuje czasy startu (StartupTimer).
+    """
+    init_display(headless)
+    if clock is None:
+        clock = SimulatedClock() if headless else FixedStepClock()
+    set_clock(clock)
+    if input_source is None:
+        input_source = KeyboardInput()
+    if seed is not None:
+        random.seed(seed)
+    screen_updater.dirty_rects = dirty_rects
+    screen_updater.invalidate()
+
+    def new_game():
+        return GameScene(input_source, headless, tuple(map_size), save_path)
+
+    def start_game():
+        assets.finish_preload()  # Grafiki zdekodowane w tle są konwertowane w głównym wątku
+        scenes.push(new_game())
+
+    def load_game():
+        assets.finish_preload()
+        scenes.push(GameScene.from_file(save_path, input_source, headless, save_path) or new_game())
+
+    game = None
+    if load_path is not None:
+        # Zapisu nie da się odczytać (brak pliku, uszkodzenie) - nowa rozgrywka
+        scenes.replace(GameScene.from_file(load_path, input_source, headless, save_path) or new_game())
+    elif not headless and show_menu:
+        assets.preload(startup_assets())
+        has_save = save_path is not None and os.path.exists(save_path)
+        scenes.replace(main_menu_scene(start_game, load_game if has_save else None))
+    else:
+        scenes.replace(new_game())
+
+    # Pętla gry: rozgrywka albo scena modalna ze szczytu stosu
+    while scenes:
+        scene = scenes.top
+        if scene.modal:
+            scenes.run_modal(screen)
+            continue
+        game = scene  # Po restarcie to już nowa rozgrywka
+        game.frame()
+        if startup_report and "game" in startup.times:  # Po pierwszej klatce rozgrywki
+            print(startup.report(), file=sys.stderr)
+            startup_report = False
+        if game.over or (max_ticks is not None and game.ticks >= max_ticks):
+            break
+
+    # Wyjście z gry zapisuje rozgrywkę (chyba że gracz zginął albo czeka okno wyboru)
+    if game is not None and game.save_path and game.player.hp > 0 and not game._suspended:
+        game.save()
+    autosaver.flush()
+
+    if headless:
+        player = game.player
+        return {
+            "ticks": game.ticks,
+            "time_ms": game_clock.get_ticks() - game.start_time,
+            "alive": player.hp > 0,
+            "hp": player.hp,
+            "level": player.level,
+            "bats_defeated": player.bats_defeated,
+            "pools": game.pool_stats(),
+        }
 
     pygame.quit()
     exit()
 
 
+def parse_args(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Roguelike Game")
+    parser.add_argument("--headless", action="store_true",
+                        help="symulacja bez okna, z zegarem symulowanym i skryptowym botem")
+    parser.add_argument("--ticks", type=int, default=None, help="kończy grę po tylu krokach logiki (w każdym trybie)")
+    parser.add_argument("--step-ms", type=float, default=TICK_MS, help="krok logiki zegara symulowanego w ms")
+    parser.add_argument("--seed", type=int, default=None, help="ziarno generatora liczb losowych")
+    parser.add_argument("--record", metavar="PLIK", help="nagraj rozgrywkę do pliku")
+    parser.add_argument("--replay", metavar="PLIK", help="odtwórz nagraną rozgrywkę")
+    parser.add_argument("--log", metavar="POZIOM", default=None,
+                        help="włącz logowanie na danym poziomie (debug, info, warning); domyślnie wyłączone")
+    parser.add_argument("--log-categories", default=None,
+                        help="logowane kategorie oddzielone przecinkami: " + ", ".join(LOG_CATEGORIES))
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="odświeżaj tylko zmienione fragmenty ekranu, gdy kamera stoi")
+    parser.add_argument("--map-size", type=int, nargs=2, metavar=("SZEROKOŚĆ", "WYSOKOŚĆ"),
+                        default=(MAP_WIDTH, MAP_HEIGHT), help="rozmiar świata w kafelkach (np. 10000 10000)")
+    parser.add_argument("--save", metavar="PLIK", default=None,
+                        help=f"plik autozapisu (domyślnie {SAVE_PATH}; w trybie headless brak zapisu)")
+    parser.add_argument("--load", metavar="PLIK", default=None, help="wczytaj rozgrywkę z pliku zapisu")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="wypisz czasy startu (import, okno, pierwsza klatka, grafiki, rozgrywka)")
+    parser.add_argument("--replay-speed", type=float, default=None,
+                        help="tempo odtwarzania (1 - czas rzeczywisty, 0 - maksymalne; domyślnie 0 w trybie headless)")
+    args = parser.parse_args(argv)
+    if args.load and (args.record or args.replay):
+        parser.error("--load nie działa razem z --record ani --replay")
+    return args
+
+
+startup.mark("import")
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.log:
+        configure_logging(args.log, args.log_categories.split(",") if args.log_categories else None)
+    if args.replay:
+        speed = args.replay_speed if args.replay_speed is not None else (0 if args.headless else 1)
+        source = InputReplayer(args.replay, speed=speed)
+        clock, seed, map_size = source.clock(), source.seed, source.map_size
+    else:
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 63)
+        if args.headless:
+            source, clock = ScriptedInput(random_keys_script(seed)), SimulatedClock(args.step_ms)
+        else:
+            source, clock = KeyboardInput(), FixedStepClock()
+        map_size = args.map_size
+        if args.record:
+            source = InputRecorder(source, seed, map_size)
+            clock = source.clock(clock)
+
+    # Wczytanie zapisu w trakcie nagrania rozjechałoby się z odtwarzaniem
+    save_path = None if args.record or args.replay else args.save or (None if args.headless else SAVE_PATH)
+
+    try:
+        result = main(headless=args.headless, input_source=source, clock=clock, max_ticks=args.ticks,
+                      seed=seed, show_menu=not args.replay, dirty_rects=args.dirty_rects, map_size=map_size,
+                      save_path=save_path, load_path=args.load, startup_report=args.startup_report)
+        if args.headless:
+            print(result)
+    finally:
+        if args.record:
+            source.save(args.record)
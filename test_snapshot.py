@@ -0,0 +1,38 @@
+"""
+Testy zapisu: rozgrywka wczytana z migawki musi zachowywać się tak samo
+jak rozgrywka bez zapisu.
+
+Użycie:
+    python -m pytest test_snapshot.py
+"""
+import pytest
+
+import roguelike as game
+
+
+@pytest.fixture
+def scene():
+    game.init_display(headless=True)
+    game.set_clock(game.SimulatedClock())
+    return game.GameScene(game.ScriptedInput([]), headless=True)
+
+
+def round_trip(scene):
+    """Scena odtworzona z zakodowanej migawki sceny."""
+    data = game.encode_snapshot(scene.snapshot())
+    return game.GameScene.from_snapshot(game.decode_snapshot(data), scene.input_source, True)
+
+
+def test_weapon_switch_after_load(scene):
+    scene.player.inventory["weapons"] = ["wooden sword", "silver sword"]
+    scene.player.equip_weapon(0)
+    loaded = round_trip(scene)
+    for player in (scene.player, loaded.player):
+        player.equip_weapon(1)
+    assert loaded.player.damage == scene.player.damage
+
+
+def test_player_stats_round_trip(scene):
+    scene.player.level_up()
+    loaded = round_trip(scene)
+    assert loaded.player.snapshot() == scene.player.snapshot()